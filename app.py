@@ -3,16 +3,27 @@ Memory Assistant v4 - Webアプリケーション
 
 FlaskベースのWebインターフェースを提供
 """
+import atexit
+import logging
 import os
 import json
+import sqlite3
+import threading
 from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # orjson が無い環境では標準の json で代用
+    orjson = None
+
 from src.database import Database
-from src.chat_service import ChatService, create_default_attribute_masters
-from src.llm_client import MockLLMClient, OllamaClient, LLMResponse
+from src.chat_service import ChatService, ensure_default_attribute_masters, parse_tier_models
+from src.llm_client import FallbackLLMClient, MockLLMClient, OllamaClient, LLMResponse
 from src.translation_service import TranslationService
+from src.log_writer import LogWriter
+from src.extraction_cache import ExtractionCache
 from src.models import AttributeMaster, AttributeRecord, LLMLog
 from datetime import datetime
 import json
@@ -20,14 +31,70 @@ import json
 # 環境変数を読み込み
 load_dotenv()
 
+# ログレベル（DEBUGにするとチャット処理の各ステップの処理時間を出力）
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
+
 # Flaskアプリケーション初期化
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-secret-key-change-in-production")
 CORS(app)
 
+
+def _json_default(obj):
+    """標準の json で datetime をISO形式に変換"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_json(obj) -> str:
+    """JSON文字列を作成（orjsonがあれば使い、datetimeはISO形式で出力）"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=_json_default)
+
+
+def ojsonify(obj, status: int = 200) -> Response:
+    """JSONレスポンスを作成（orjsonがあれば使い、datetimeはISO形式で出力）"""
+    if orjson is not None:
+        body = orjson.dumps(obj)
+    else:
+        body = json.dumps(obj, ensure_ascii=False, default=_json_default)
+    return app.response_class(body, status=status, mimetype="application/json")
+
 # データベース初期化
-db = Database("memory_assistant.db")
+# SQLITE_POOL_SIZE: 読み取り専用接続プールの最大数（書き込み用接続は別に1本）
+db = Database(os.environ.get("DATABASE_PATH", "memory_assistant.db"), pool_size=int(os.environ.get("SQLITE_POOL_SIZE", "4")))
 db.initialize()
+# LLMログの書き込みスレッドなどを止めた後、最後に接続を閉じる（atexitは登録の逆順に実行される）
+atexit.register(db.close)
+# 初回起動時（属性マスタが空のとき）だけデフォルトの属性マスタを作成
+ensure_default_attribute_masters(db, only_if_empty=True)
+
+
+def schedule_db_maintenance(interval: float):
+    """DBの保守処理（統計情報の更新・WALの切り詰め）をinterval秒ごとに実行"""
+    def run():
+        try:
+            db.maintenance()
+        except sqlite3.Error as e:
+            print(f"Warning: DBの保守処理に失敗しました: {e}")
+        schedule_db_maintenance(interval)
+
+    timer = threading.Timer(interval, run)
+    timer.daemon = True
+    timer.start()
+
+
+# DB_MAINTENANCE_INTERVAL: DBの保守処理を行う間隔（分。0で無効）
+db_maintenance_interval = float(os.environ.get("DB_MAINTENANCE_INTERVAL", "15"))
+if db_maintenance_interval > 0:
+    schedule_db_maintenance(db_maintenance_interval * 60)
+
+# LLMログはバックグラウンドスレッドでまとめて書き込む（チャット応答をディスク書き込みで待たせない）
+log_writer = LogWriter(db)
+log_writer.start()
+atexit.register(log_writer.stop)
 
 # LLMクライアント初期化
 llm_provider = os.environ.get("LLM_PROVIDER", "ollama")
@@ -36,8 +103,18 @@ if llm_provider == "ollama":
     try:
         ollama_url = os.environ.get("OLLAMA_URL", "http://localhost:11434")
         ollama_model = os.environ.get("OLLAMA_MODEL", "llama3.1:8b")
-        llm_client = OllamaClient(base_url=ollama_url, model=ollama_model)
+        # OLLAMA_KEEP_ALIVE: モデルをメモリに保持する時間（未設定ならOllamaサーバーのデフォルト）
+        ollama_keep_alive = os.environ.get("OLLAMA_KEEP_ALIVE") or None
+        llm_client = OllamaClient(base_url=ollama_url, model=ollama_model, keep_alive=ollama_keep_alive)
         print(f"Using Ollama LLM client: {ollama_url} with model {ollama_model}")
+
+        # OLLAMA_FALLBACK_URLS: メインのOllamaに接続できない場合に順に試すOllamaのURL（カンマ区切り）
+        fallback_urls = [url.strip() for url in os.environ.get("OLLAMA_FALLBACK_URLS", "").split(",") if url.strip()]
+        if fallback_urls:
+            llm_client = FallbackLLMClient(
+                [llm_client] + [OllamaClient(base_url=url, model=ollama_model, keep_alive=ollama_keep_alive) for url in fallback_urls]
+            )
+            print(f"Fallback Ollama URLs: {', '.join(fallback_urls)}")
     except Exception as e:
         print(f"Warning: Ollama client initialization failed: {e}")
         print("Using mock LLM client instead")
@@ -49,14 +126,14 @@ else:
 
 # LLMログコールバック関数
 def llm_log_callback(prompt: str, response: LLMResponse, task_type: str, attribute_name: str = None, sent_at: datetime = None, received_at: datetime = None):
-    """LLMとのやり取りをデータベースに記録"""
-    # モデル名を取得
-    model = getattr(llm_client, 'model', 'mock')
+    """LLMとのやり取りを書き込みキューに追加"""
+    # モデル名を取得（呼び出しごとにモデルを指定した場合はそのモデル）
+    model = response.model or getattr(llm_client, 'model', 'mock')
 
     # raw_responseをJSON文字列に変換
     raw_response_str = None
     if response.raw_response:
-        raw_response_str = json.dumps(response.raw_response, ensure_ascii=False)
+        raw_response_str = dumps_json(response.raw_response)
 
     log = LLMLog(
         log_id=None,
@@ -69,25 +146,80 @@ def llm_log_callback(prompt: str, response: LLMResponse, task_type: str, attribu
         response=response.content,
         raw_response=raw_response_str,
         attribute_name=attribute_name,
-        metadata=None
+        metadata=dumps_json(response.metadata) if response.metadata else None
     )
-    db.insert_llm_log(log)
+    log_writer.put(log)
 
 
 # LLMクライアントにログコールバックを設定
 llm_client.set_log_callback(llm_log_callback)
+atexit.register(llm_client.close)
+
+# 判定・抽出結果のキャッシュ
+# EXTRACTION_CACHE_DIR: ディスクへの保存先（未設定ならメモリのみ）
+# EXTRACTION_MEMORY_CACHE_SIZE: メモリに保持する件数（0かつEXTRACTION_CACHE_DIR未設定ならキャッシュしない）
+extraction_cache_dir = os.environ.get("EXTRACTION_CACHE_DIR") or None
+extraction_memory_cache_size = int(os.environ.get("EXTRACTION_MEMORY_CACHE_SIZE", "1024"))
+extraction_cache = None
+if extraction_cache_dir or extraction_memory_cache_size > 0:
+    extraction_cache = ExtractionCache(extraction_cache_dir, memory_size=extraction_memory_cache_size)
+    llm_client.set_extraction_cache(extraction_cache)
+    if extraction_cache_dir:
+        print(f"Extraction cache enabled: {extraction_cache_dir}")
 
 # 翻訳サービス初期化
 translation_enabled = os.environ.get("ENABLE_TRANSLATION", "true").lower() == "true"
 translation_service = None
 if translation_enabled:
-    translation_service = TranslationService(llm_client)
+    # TRANSLATION_CACHE_SIZE: 同じ文章・同じコンテキストの翻訳結果をメモリに保持する件数（0で無効）
+    # EXTRACTION_CACHE_DIR が設定されていれば、翻訳結果もディスクに保存して再起動後も使う
+    translation_service = TranslationService(
+        llm_client,
+        cache_size=int(os.environ.get("TRANSLATION_CACHE_SIZE", "256")),
+        persistent_cache=extraction_cache if extraction_cache_dir else None
+    )
     print("Translation service enabled: Japanese <-> English")
 else:
     print("Translation service disabled")
 
 # チャットサービス初期化
-chat_service = ChatService(llm_client, db, translation_service)
+# ATTRIBUTE_STRATEGY: per_attribute（属性ごとに判定・抽出）/ combined（全属性を1回のLLM呼び出しで判定・抽出）
+#                     / batch_judgment（判定のみ全属性を1回のLLM呼び出しで行う）
+#                     / fused（属性ごとに判定と抽出を1回のLLM呼び出しで行う）
+attribute_strategy = os.environ.get("ATTRIBUTE_STRATEGY", "per_attribute")
+# LLM_CONCURRENCY: 属性ごとの判定・抽出を並行して問い合わせる最大数
+llm_concurrency = int(os.environ.get("LLM_CONCURRENCY", "4"))
+# EXTRACTION_MIN_CHARS: この文字数未満の入力（と挨拶のみの入力）は属性の判定・抽出を省略
+extraction_min_chars = int(os.environ.get("EXTRACTION_MIN_CHARS", "2"))
+# OLLAMA_TIER_MODELS: 入力の複雑さに応じて抽出に使うモデル（例: 1:llama3.2:1b,2:llama3.1:8b,3:qwen2.5:14b）
+tier_models = parse_tier_models(os.environ.get("OLLAMA_TIER_MODELS", ""))
+# BACKGROUND_EXTRACTION: true なら応答を返した後に属性の抽出・登録をバックグラウンドで行う
+background_extraction = os.environ.get("BACKGROUND_EXTRACTION", "false").lower() == "true"
+# CHAT_HISTORY_LIMIT: メモリに保持するチャット履歴の最大件数（古いものから破棄）
+history_limit = int(os.environ.get("CHAT_HISTORY_LIMIT", "100"))
+# RESPONSE_CACHE_SIZE: 同じ状況での同じ入力に対する応答をキャッシュする件数（0で無効）
+response_cache_size = int(os.environ.get("RESPONSE_CACHE_SIZE", "0"))
+# EXTRACT_ONLY_REQUIRED: true なら判定で不要とされた属性の抽出を省略する
+extract_only_required = os.environ.get("EXTRACT_ONLY_REQUIRED", "false").lower() == "true"
+# STREAM_TRANSLATION: true ならストリーミング時に応答を文ごとに翻訳して逐次表示する
+stream_translation = os.environ.get("STREAM_TRANSLATION", "false").lower() == "true"
+chat_service = ChatService(
+    llm_client,
+    db,
+    translation_service,
+    attribute_strategy=attribute_strategy,
+    llm_concurrency=llm_concurrency,
+    extraction_min_chars=extraction_min_chars,
+    tier_models=tier_models,
+    background_extraction=background_extraction,
+    history_limit=history_limit,
+    response_cache_size=response_cache_size,
+    extract_only_required=extract_only_required,
+    stream_translation=stream_translation
+)
+# 終了時に実行中の属性抽出の登録を待ってからスレッドプールを止める
+# （LLMクライアントのclose・LLMログの書き込み停止より先に行う）
+atexit.register(chat_service.close)
 
 
 # ================
@@ -130,6 +262,24 @@ def attribute_records():
 
 # === チャット API ===
 
+def status_to_dict(status) -> dict:
+    """ステータスを画面に送る形式に変換"""
+    return {
+        "task_type": status.task_type,
+        "attribute_name": status.attribute_name,
+        "status": status.status,
+        "display_text": status.display_text
+    }
+
+
+def sse_event(event_type: str, data: dict = None) -> str:
+    """Server-Sent Eventsの1イベント分の文字列を作成"""
+    event = {"type": event_type}
+    if data is not None:
+        event["data"] = data
+    return f"data: {dumps_json(event)}\n\n"
+
+
 @app.route("/api/chat", methods=["POST"])
 def api_chat():
     """チャットメッセージを処理"""
@@ -149,12 +299,9 @@ def api_chat():
         try:
             while True:
                 status = next(gen)
-                statuses.append({
-                    "task_type": status.task_type,
-                    "attribute_name": status.attribute_name,
-                    "status": status.status,
-                    "display_text": status.display_text
-                })
+                # 逐次生成の途中経過は最終的な応答に含まれるため返さない
+                if status.task_type != "response_delta":
+                    statuses.append(status_to_dict(status))
         except StopIteration as e:
             # ジェネレーターのreturn値を取得
             response = e.value
@@ -173,12 +320,12 @@ def api_chat():
 def api_chat_history():
     """チャット履歴を取得"""
     history = chat_service.get_chat_history()
-    return jsonify({
+    return ojsonify({
         "history": [
             {
                 "role": msg.role,
                 "content": msg.content,
-                "timestamp": msg.timestamp.isoformat()
+                "timestamp": msg.timestamp
             }
             for msg in history
         ]
@@ -212,48 +359,30 @@ def api_chat_stream():
                     status = next(gen)
 
                     # 応答準備完了の場合は即座に応答を送信
-                    if status.task_type == "response_ready":
-                        response_data = {
-                            "type": "response",
-                            "data": {
-                                "response": status.response_text,
-                                "used_attributes": status.used_attributes
-                            }
-                        }
-                        yield f"data: {json.dumps(response_data, ensure_ascii=False)}\n\n"
+                    if status.task_type == "response_delta":
+                        # 生成された応答の一部を逐次送信
+                        yield sse_event("response_delta", {"text": status.response_text})
+                    elif status.task_type == "response_ready":
+                        yield sse_event("response", {
+                            "response": status.response_text,
+                            "used_attributes": status.used_attributes
+                        })
                     else:
                         # 通常のステータス
-                        event_data = {
-                            "type": "status",
-                            "data": {
-                                "task_type": status.task_type,
-                                "attribute_name": status.attribute_name,
-                                "status": status.status,
-                                "display_text": status.display_text
-                            }
-                        }
-                        yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
+                        yield sse_event("status", status_to_dict(status))
                 except StopIteration as e:
                     # 属性抽出の完了を通知（応答は既にresponse_readyで送信済み）
                     response = e.value
-                    completion_data = {
-                        "type": "extraction_complete",
-                        "data": {
-                            "extracted_attributes": response.extracted_attributes
-                        }
-                    }
-                    yield f"data: {json.dumps(completion_data, ensure_ascii=False)}\n\n"
+                    yield sse_event("extraction_complete", {
+                        "extracted_attributes": response.extracted_attributes
+                    })
                     break
 
             # 完了通知
-            yield "data: {\"type\": \"done\"}\n\n"
+            yield sse_event("done")
 
         except Exception as e:
-            error_data = {
-                "type": "error",
-                "data": {"error": str(e)}
-            }
-            yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+            yield sse_event("error", {"error": str(e)})
 
     return Response(
         stream_with_context(generate()),
@@ -269,33 +398,49 @@ def api_chat_stream():
 
 @app.route("/api/logs", methods=["GET"])
 def api_logs():
-    """LLMログを取得"""
-    limit = request.args.get("limit", type=int)
-    logs = db.get_all_llm_logs(limit=limit)
+    """LLMログの一覧を1ページ分取得（プロンプト・応答などの詳細は /api/logs/<log_id> で取得）"""
+    page = max(request.args.get("page", 1, type=int), 1)
+    page_size = request.args.get("page_size", request.args.get("limit", 50, type=int), type=int)
+    page_size = min(max(page_size, 1), 500)
+
+    # 書き込み待ちのログも表示に含める
+    log_writer.flush()
+    logs = db.get_llm_logs_page(limit=page_size, offset=(page - 1) * page_size)
+
+    return ojsonify({
+        "logs": logs,
+        "total": db.count_llm_logs(),
+        "page": page,
+        "page_size": page_size
+    })
 
-    return jsonify({
-        "logs": [
-            {
-                "log_id": log.log_id,
-                "timestamp": log.timestamp.isoformat(),
-                "sent_at": log.sent_at.isoformat() if log.sent_at else None,
-                "received_at": log.received_at.isoformat() if log.received_at else None,
-                "model": log.model,
-                "task_type": log.task_type,
-                "prompt": log.prompt,
-                "response": log.response,
-                "raw_response": log.raw_response,
-                "attribute_name": log.attribute_name,
-                "metadata": log.metadata
-            }
-            for log in logs
-        ]
+
+@app.route("/api/logs/<int:log_id>", methods=["GET"])
+def api_log_detail(log_id: int):
+    """LLMログの詳細を取得"""
+    log = db.get_llm_log(log_id)
+    if not log:
+        return jsonify({"error": "ログが見つかりません"}), 404
+
+    return ojsonify({
+        "log_id": log.log_id,
+        "timestamp": log.timestamp,
+        "sent_at": log.sent_at,
+        "received_at": log.received_at,
+        "model": log.model,
+        "task_type": log.task_type,
+        "prompt": log.prompt,
+        "response": log.response,
+        "raw_response": log.raw_response,
+        "attribute_name": log.attribute_name,
+        "metadata": log.metadata
     })
 
 
 @app.route("/api/logs/clear", methods=["POST"])
 def api_logs_clear():
     """ログをクリア"""
+    log_writer.flush()
     db.delete_all_llm_logs()
     return jsonify({"success": True})
 
@@ -305,7 +450,7 @@ def api_logs_clear():
 @app.route("/api/attribute-masters", methods=["GET"])
 def api_get_attribute_masters():
     """全属性マスタを取得"""
-    masters = db.get_all_attribute_masters()
+    masters = db.get_all_attribute_masters_cached()
     return jsonify({
         "masters": [
             {
@@ -322,7 +467,7 @@ def api_get_attribute_masters():
 @app.route("/api/attribute-masters/<int:attribute_id>", methods=["GET"])
 def api_get_attribute_master(attribute_id):
     """特定の属性マスタを取得"""
-    master = db.get_attribute_master(attribute_id)
+    master = db.get_attribute_master_cached(attribute_id)
     if master:
         return jsonify({
             "attribute_id": master.attribute_id,
@@ -382,8 +527,8 @@ def api_delete_attribute_master(attribute_id):
 
 @app.route("/api/attribute-masters/init-defaults", methods=["POST"])
 def api_init_default_masters():
-    """デフォルトの属性マスタを初期化"""
-    count = create_default_attribute_masters(db)
+    """未登録のデフォルト属性マスタを追加（すべて登録済みなら何もしない）"""
+    count = ensure_default_attribute_masters(db)
     return jsonify({"success": True, "count": count})
 
 
@@ -394,23 +539,9 @@ def api_get_attribute_records():
     """全属性レコードを取得"""
     attribute_id = request.args.get("attribute_id", type=int)
 
-    if attribute_id:
-        records = db.get_attribute_records_by_attribute_id(attribute_id)
-    else:
-        records = db.get_all_attribute_records()
-
-    return jsonify({
-        "records": [
-            {
-                "sequence_no": r.sequence_no,
-                "attribute_id": r.attribute_id,
-                "content": r.content,
-                "created_at": r.created_at.isoformat(),
-                "updated_at": r.updated_at.isoformat()
-            }
-            for r in records
-        ]
-    })
+    # 一覧表示用にデータクラスを経由せず辞書のまま返す
+    records = db.get_attribute_records_as_dicts(attribute_id or None)
+    return ojsonify({"records": records})
 
 
 @app.route("/api/attribute-records", methods=["POST"])
@@ -460,6 +591,7 @@ def api_delete_attribute_record(sequence_no):
 
 if __name__ == "__main__":
     # 開発サーバーを起動
+    # threaded=True: LLM応答待ちのチャットリクエストが、ログ・属性画面のAPIをブロックしないようにする
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("FLASK_DEBUG", "True").lower() == "true"
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    app.run(host="0.0.0.0", port=port, debug=debug, threaded=True)
@@ -12,17 +12,32 @@ design.md で定義されたフローを実装:
 - ユーザー入力（日本語）→ 英語に翻訳 → LLM処理 → 応答を日本語に翻訳 → 出力
 - 翻訳時には直近2つのメッセージの英語版をコンテキストとして使用
 """
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Optional, Callable, Generator
+from itertools import islice
+from operator import attrgetter
+from typing import Any, Optional, Callable, Generator
 
-from .models import AttributeMaster, AttributeRecord, ChatMessage, LLMTaskStatus
+from .models import DATACLASS_SLOTS, AttributeMaster, AttributeRecord, ChatMessage, LLMTaskStatus
 from .database import Database
-from .llm_client import LLMClient
-from .translation_service import TranslationService
+from .llm_client import AttributeAnalysis, LLMClient, normalize_for_cache
+from .translation_service import TranslationService, format_translation_context, has_letters, is_japanese, is_mostly_japanese
 
+# 処理時間の計測ログ（DEBUGレベルが有効なときだけ文字列に整形される）
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+def _elapsed_ms(start_ns: int) -> float:
+    """perf_counter_nsで取得した開始時刻からの経過時間（ミリ秒）"""
+    return (time.perf_counter_ns() - start_ns) / 1e6
+
+
+@dataclass(**DATACLASS_SLOTS)
 class ChatResponse:
     """チャット応答の結果"""
     response_text: str
@@ -31,6 +46,69 @@ class ChatResponse:
     task_statuses: list[LLMTaskStatus]
 
 
+# 属性の判定・抽出の実行方式
+# per_attribute: 属性ごとに判定・抽出をそれぞれLLMに問い合わせる
+# combined: 全属性の判定と抽出を1回のLLM呼び出しで行う（失敗時はper_attributeに戻す）
+# batch_judgment: 全属性の判定を1回のLLM呼び出しで行い、抽出は属性ごとに行う（失敗時は属性ごとの判定に戻す）
+# fused: 属性ごとに判定と抽出を1回のLLM呼び出しで行い、抽出結果の登録だけを応答後に行う
+ATTRIBUTE_STRATEGIES = ("per_attribute", "combined", "batch_judgment", "fused")
+
+# 属性情報を含まない挨拶・相づちのパターン（判定・抽出を省略する）
+GREETING_RE = re.compile(
+    r"^(こんにちは|こんばんは|おはよう(ございます)?|ありがとう(ございます)?|どうも|はい|いいえ|了解(です)?|"
+    r"hi|hello|hey|thanks?|thank you|ok|okay)[。、！!？?.,\s〜ー]*$",
+    re.IGNORECASE
+)
+
+
+# 入力の複雑さによるティアの境界（複雑さがこの値未満ならそのティアを使う）
+TIER_THRESHOLDS = ((0.2, 1), (0.6, 2))
+# 上記の境界に収まらない入力のティア
+MAX_TIER = 3
+
+
+def estimate_complexity(text: str) -> float:
+    """入力の複雑さを文字数と単語数から見積もる"""
+    return len(text) / 1000 + len(text.split()) / 100
+
+
+def select_tier(text: str) -> int:
+    """入力の複雑さから抽出に使うモデルのティアを選ぶ（1が最も軽量）"""
+    complexity = estimate_complexity(text)
+    for threshold, tier in TIER_THRESHOLDS:
+        if complexity < threshold:
+            return tier
+    return MAX_TIER
+
+
+def parse_tier_models(spec: str) -> dict[int, str]:
+    """「1:llama3.2:1b,2:llama3.1:8b」形式の設定を {ティア: モデル名} に変換"""
+    tier_models: dict[int, str] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        tier, _, model = item.partition(":")
+        if not model:
+            raise ValueError(f"ティアの設定が不正です: {item}")
+        tier_models[int(tier)] = model.strip()
+    return tier_models
+
+
+# 応答を文ごとに翻訳するときの文の区切り（文末記号の後の空白。区切りの空白も結果に含める）
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])(\s+)")
+
+
+def is_trivial_input(text: str, min_chars: int = 2) -> bool:
+    """属性情報を含まないことが明らかな入力か（短すぎる・記号のみ・挨拶のみ）"""
+    stripped = text.strip()
+    if len(stripped) < min_chars:
+        return True
+    if not any(ch.isalnum() for ch in stripped):
+        return True
+    return GREETING_RE.match(stripped) is not None
+
+
 class ChatService:
     """チャットワークフローを管理するサービス"""
 
@@ -39,174 +117,418 @@ class ChatService:
         llm_client: LLMClient,
         database: Database,
         translation_service: Optional[TranslationService] = None,
-        status_callback: Optional[Callable[[LLMTaskStatus], None]] = None
+        status_callback: Optional[Callable[[LLMTaskStatus], None]] = None,
+        attribute_strategy: str = "per_attribute",
+        llm_concurrency: int = 4,
+        extraction_min_chars: int = 2,
+        tier_models: Optional[dict[int, str]] = None,
+        background_extraction: bool = False,
+        history_limit: int = 100,
+        response_cache_size: int = 0,
+        extract_only_required: bool = False,
+        stream_translation: bool = False
     ):
+        if attribute_strategy not in ATTRIBUTE_STRATEGIES:
+            raise ValueError(f"不明な属性処理方式です: {attribute_strategy}")
+
         self.llm = llm_client
         self.db = database
         self.translation_service = translation_service
         self.status_callback = status_callback
-        self.chat_history: list[ChatMessage] = []
+        self.attribute_strategy = attribute_strategy
+        # この文字数未満の入力は属性の判定・抽出を省略する
+        self.extraction_min_chars = extraction_min_chars
+        # Trueなら判定で不要とされた属性の抽出を省略する（その入力に含まれる情報を取りこぼすことがある）
+        self.extract_only_required = extract_only_required
+        # Trueならストリーミング時に応答を文ごとに翻訳して逐次表示する（翻訳の呼び出し回数は文の数だけ増える）
+        self.stream_translation = stream_translation
+        # 抽出に使うモデルをティアごとに指定（未指定ならクライアントのデフォルトモデル）
+        self.tier_models = tier_models or {}
+        # チャット履歴（古いものから破棄し、長時間のセッションでもメモリが増え続けないようにする）
+        self.chat_history: deque[ChatMessage] = deque(maxlen=history_limit)
+        # 翻訳のコンテキストに使う直近2件の英語メッセージ（履歴への追加時に更新し、毎回履歴から組み立てない）
+        self._translation_context: deque[dict] = deque(maxlen=2)
+        # 属性ごとのLLM呼び出しを並行実行するスレッドプール（同時実行数はLLMサーバーの負荷に合わせて制限）
+        self.llm_concurrency = max(1, llm_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix="llm")
+        # ストリーミング翻訳の文ごとの翻訳用（先行して投入した抽出の後ろに並ばず、表示を待たせない）
+        self._translation_executor = ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix="translation")
+        # Trueなら応答を返した後、属性の抽出・登録をバックグラウンドで行う（次のターンの判定前に完了を待つ）
+        self.background_extraction = background_extraction
+        self._background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extraction")
+        self._pending_extraction: Optional[Future] = None
+        # 同じ状況での同じ入力に対する応答のキャッシュ（0なら使わない。古いものから破棄）
+        self.response_cache_size = response_cache_size
+        self._response_cache: OrderedDict[tuple, tuple[str, str, dict[str, str]]] = OrderedDict()
+        self._response_cache_lock = threading.Lock()
 
     def _emit_status(self, status: LLMTaskStatus):
         """ステータスを通知"""
         if self.status_callback:
             self.status_callback(status)
 
-    def process_user_input(self, user_input: str) -> ChatResponse:
-        """
-        ユーザー入力を処理して応答を生成
-
-        Returns:
-            ChatResponse: 応答テキストと処理情報
-        """
-        task_statuses: list[LLMTaskStatus] = []
-
-        # 翻訳パイプライン: ユーザー入力を英語に翻訳
-        user_input_en = user_input
-        if self.translation_service:
-            status = LLMTaskStatus(
-                task_type="translation_input",
-                status="processing"
-            )
-            task_statuses.append(status)
-            self._emit_status(status)
-
-            # 日本語→英語翻訳時：直近2件の英語メッセージをコンテキストとして使用
-            context_messages_en = [
-                {"role": msg.role, "content": msg.content_en}
-                for msg in self.chat_history[-2:]
-                if msg.content_en is not None
-            ] if len(self.chat_history) > 0 else None
-
-            user_input_en = self.translation_service.translate_ja_to_en(
-                user_input,
-                context_messages_en if context_messages_en else None
+    def _append_message(self, message: ChatMessage):
+        """チャット履歴にメッセージを追加し、翻訳のコンテキストも更新"""
+        self.chat_history.append(message)
+        if message.content_en is not None:
+            self._translation_context.append(message.llm_dict)
+
+    def _recent_messages(self, count: int, skip_latest: int = 0) -> list[ChatMessage]:
+        """直近のメッセージを古い順に取得（最新のskip_latest件は除く）。履歴全体はコピーしない"""
+        return list(islice(reversed(self.chat_history), skip_latest, skip_latest + count))[::-1]
+
+    def _history_for_llm(self) -> list[dict]:
+        """応答生成に渡す履歴（現在の入力を除く直近5件。翻訳が有効なら英語を使う）"""
+        pick = attrgetter("llm_dict" if self.translation_service else "content_dict")
+        return [pick(msg) for msg in self._recent_messages(5, skip_latest=1)]
+
+    def _response_cache_key(self, user_input_en: str, state: tuple) -> tuple:
+        """応答キャッシュのキー（正規化した入力・直前の履歴・応答を左右する状態）"""
+        history = tuple(
+            (msg.role, msg.content_en or msg.content)
+            for msg in self._recent_messages(5, skip_latest=1)
+        )
+        return (normalize_for_cache(user_input_en), history, state)
+
+    def _get_cached_response(self, key: tuple) -> Optional[tuple[str, str, dict[str, str]]]:
+        """キャッシュした応答（日本語, 英語, 使用した属性）を取得"""
+        with self._response_cache_lock:
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                self._response_cache.move_to_end(key)
+            return cached
+
+    def _store_cached_response(self, key: tuple, response_text: str, response_text_en: str, used_attributes: dict[str, str]):
+        """応答をキャッシュに保存し、上限を超えたら最も古いものを破棄"""
+        with self._response_cache_lock:
+            self._response_cache[key] = (response_text, response_text_en, dict(used_attributes))
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self.response_cache_size:
+                self._response_cache.popitem(last=False)
+
+    def _generate_response(
+        self, user_input_en: str, required_attributes: dict[str, str], streaming: bool
+    ) -> Generator[LLMTaskStatus, None, str]:
+        """応答文を生成（ストリーミングで翻訳が不要なら、生成された部分から順にresponse_deltaで通知）"""
+        # チャット履歴を構築（現在のユーザー入力は除外し、それ以前の直近5件を使用）
+        history_for_llm = self._history_for_llm()
+
+        if self.translation_service or not streaming:
+            # 翻訳には応答の全文が必要なため、ストリーミングせずに生成する
+            return self.llm.generate_response(
+                chat_history=history_for_llm,
+                user_input=user_input_en,
+                attributes=required_attributes
             )
 
-            status.status = "completed"
-            self._emit_status(status)
-
-        # チャット履歴にユーザー入力を追加（日本語と英語の両方を保存）
-        self.chat_history.append(ChatMessage(role="user", content=user_input, content_en=user_input_en))
-
-        # === Step 1 & 2: 属性の判定と抽出 ===
-        masters = self.db.get_all_attribute_masters()
-        required_attributes: dict[str, str] = {}
-
-        for master in masters:
-            # Step 1: 判定（英語の入力を使用）
-            status = LLMTaskStatus(
-                task_type="judgment",
-                attribute_name=master.attribute_name,
-                status="processing"
+        # 生成された部分から順に通知し、画面に逐次表示できるようにする
+        chunks: list[str] = []
+        for chunk in self.llm.generate_response_stream(
+            chat_history=history_for_llm,
+            user_input=user_input_en,
+            attributes=required_attributes
+        ):
+            chunks.append(chunk)
+            yield LLMTaskStatus(
+                task_type="response_delta",
+                status="processing",
+                response_text=chunk
             )
+        return "".join(chunks).strip()
+
+    def _stream_translated_response(
+        self, user_input_en: str, required_attributes: dict[str, str]
+    ) -> Generator[LLMTaskStatus, None, tuple[str, str]]:
+        """応答文を生成しながら文ごとに日本語に翻訳し、翻訳できた文から順にresponse_deltaで通知（英語と日本語の全文を返す）"""
+        # 全ての文で同じコンテキストを使うため、プロンプト用の文字列は一度だけ組み立てる
+        context_text = format_translation_context(list(self._translation_context))
+        chunks_en: list[str] = []
+        translated: list[str] = []
+        # 翻訳中の文（LLM_CONCURRENCYが2以上なら、応答の生成を待たせずに並行して翻訳する）
+        in_flight: deque[Future] = deque()
+
+        def translate(sentence: str, separator: str) -> str:
+            if is_mostly_japanese(sentence) or not has_letters(sentence):
+                text = sentence
+            else:
+                text = self.translation_service.translate_en_to_ja(sentence, context_text=context_text)
+            # 段落の区切り（改行）は残す
+            return text + "\n" * separator.count("\n")
+
+        def delta(text: str) -> LLMTaskStatus:
+            translated.append(text)
+            return LLMTaskStatus(task_type="response_delta", status="processing", response_text=text)
+
+        def submit(sentence: str, separator: str) -> Generator[LLMTaskStatus, None, None]:
+            if self.llm_concurrency == 1:
+                yield delta(translate(sentence, separator))
+            else:
+                in_flight.append(self._translation_executor.submit(translate, sentence, separator))
+
+        def finished(wait: bool = False) -> Generator[LLMTaskStatus, None, None]:
+            # 翻訳が終わった文から、文の順番を保って通知する
+            while in_flight and (wait or in_flight[0].done()):
+                yield delta(in_flight.popleft().result())
+
+        pending = ""
+        for chunk in self.llm.generate_response_stream(
+            chat_history=self._history_for_llm(),
+            user_input=user_input_en,
+            attributes=required_attributes
+        ):
+            chunks_en.append(chunk)
+            # 文末まで届いた文だけを翻訳し、途中の文は次のチャンクを待つ
+            parts = SENTENCE_END_RE.split(pending + chunk)
+            pending = parts.pop()
+            for sentence, separator in zip(parts[::2], parts[1::2]):
+                if sentence.strip():
+                    yield from submit(sentence.strip(), separator)
+            yield from finished()
+        if pending.strip():
+            yield from submit(pending.strip(), "")
+        yield from finished(wait=True)
+
+        return "".join(chunks_en).strip(), "".join(translated).strip()
+
+    def _translate_input(self, user_input: str, task_statuses: list[LLMTaskStatus]) -> Generator[LLMTaskStatus, None, str]:
+        """ユーザー入力を英語に翻訳（日本語を含まない入力はそのまま使う）"""
+        if not self.translation_service:
+            return user_input
+        if not is_japanese(user_input):
+            status = LLMTaskStatus(task_type="translation_skipped", status="completed")
             task_statuses.append(status)
-            self._emit_status(status)
+            yield status
+            return user_input
 
-            is_required = self.llm.judge(master.judgment_prompt, user_input_en, master.attribute_name)
+        status = LLMTaskStatus(
+            task_type="translation_input",
+            status="processing"
+        )
+        task_statuses.append(status)
+        yield status
 
-            status.status = "completed"
-            self._emit_status(status)
+        # 日本語→英語翻訳時：直近2件の英語メッセージをコンテキストとして使用
+        user_input_en = self.translation_service.translate_ja_to_en(
+            user_input,
+            list(self._translation_context) or None
+        )
 
-            if is_required:
-                # Step 2: 属性データの取得（瞬時に完了するのでステータス表示なし）
-                content = self.db.get_latest_attribute_content(master.attribute_id)
-                if content:
-                    required_attributes[master.attribute_name] = content
+        status.status = "completed"
+        yield status
+        return user_input_en
+
+    def _translate_response(self, response_text_en: str, task_statuses: list[LLMTaskStatus]) -> Generator[LLMTaskStatus, None, str]:
+        """応答を日本語に翻訳（既に日本語の応答と、数字・記号のみの応答はそのまま使う）"""
+        if not self.translation_service:
+            return response_text_en
+        if is_mostly_japanese(response_text_en) or not has_letters(response_text_en):
+            status = LLMTaskStatus(task_type="translation_skipped", status="completed")
+            task_statuses.append(status)
+            yield status
+            return response_text_en
 
-        # === Step 3: 応答文の生成 ===
         status = LLMTaskStatus(
-            task_type="response",
+            task_type="translation_response",
             status="processing"
         )
         task_statuses.append(status)
-        self._emit_status(status)
+        yield status
 
-        # チャット履歴を構築（現在のユーザー入力は除外し、それ以前の直近5件を使用）
-        if self.translation_service:
-            history_for_llm = [
-                {"role": msg.role, "content": msg.content_en if msg.content_en else msg.content}
-                for msg in self.chat_history[:-1][-5:]  # 現在の入力を除く直近5件
-            ]
-        else:
-            history_for_llm = [
-                {"role": msg.role, "content": msg.content}
-                for msg in self.chat_history[:-1][-5:]  # 現在の入力を除く直近5件
-            ]
-
-        response_text_en = self.llm.generate_response(
-            chat_history=history_for_llm,
-            user_input=user_input_en,
-            attributes=required_attributes
+        # 英語→日本語翻訳時：直近2件の英語メッセージをコンテキストとして使用
+        response_text = self.translation_service.translate_en_to_ja(
+            response_text_en,
+            list(self._translation_context) or None
         )
 
         status.status = "completed"
-        self._emit_status(status)
+        yield status
+        return response_text
 
-        # 応答を日本語に翻訳
-        if self.translation_service:
+    def _load_masters(self, user_input: str, task_statuses: list[LLMTaskStatus]) -> Generator[LLMTaskStatus, None, list[AttributeMaster]]:
+        """判定・抽出の対象となる属性マスタを取得（挨拶など自明な入力では空にして判定・抽出を省略）"""
+        if is_trivial_input(user_input, self.extraction_min_chars):
             status = LLMTaskStatus(
-                task_type="translation_response",
-                status="processing"
+                task_type="skip_extraction",
+                status="completed"
             )
             task_statuses.append(status)
-            self._emit_status(status)
+            yield status
+            return []
+        return self.db.get_all_attribute_masters_cached()
+
+    def _select_extraction_model(self, user_input_en: str) -> tuple[Optional[str], Optional[dict]]:
+        """入力の複雑さに応じて抽出に使うモデルを選ぶ。返り値: (モデル名, ログ用メタデータ)"""
+        if not self.tier_models:
+            return None, None
+        tier = select_tier(user_input_en)
+        # 指定されたティアのモデルが無ければ、それより上位のティアを使う
+        for candidate in sorted(self.tier_models):
+            if candidate >= tier:
+                return self.tier_models[candidate], {"start_tier": tier, "tier": candidate}
+        top = max(self.tier_models)
+        return self.tier_models[top], {"start_tier": tier, "tier": top}
+
+    def _drain(self, gen: Generator[LLMTaskStatus, None, object]):
+        """ジェネレーターのステータスをコールバックに通知し、戻り値を返す"""
+        try:
+            while True:
+                self._emit_status(next(gen))
+        except StopIteration as e:
+            return e.value
+
+    def _start_background_extraction(self, gen: Generator[LLMTaskStatus, None, list[tuple[str, str]]]):
+        """属性の抽出・登録をバックグラウンドで開始"""
+        self._pending_extraction = self._background_executor.submit(self._drain, gen)
+
+    def wait_for_extraction(self):
+        """バックグラウンドで実行中の属性の抽出・登録が終わるまで待つ"""
+        future, self._pending_extraction = self._pending_extraction, None
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception:
+            logger.warning("バックグラウンドでの属性の抽出・登録に失敗しました", exc_info=True)
+
+    def close(self):
+        """実行中の属性の抽出・登録を待ってから、スレッドプールを停止"""
+        self.wait_for_extraction()
+        for executor in (self._executor, self._translation_executor, self._background_executor):
+            executor.shutdown(cancel_futures=True)
+
+    def _analyze_attributes(
+        self, masters: list[AttributeMaster], user_input_en: str, task_statuses: list[LLMTaskStatus]
+    ) -> Generator[LLMTaskStatus, None, Optional[dict[str, AttributeAnalysis]]]:
+        """全属性の判定と抽出を1回のLLM呼び出しで行う（応答が不正ならNoneを返す）"""
+        if self.attribute_strategy != "combined" or not masters:
+            return None
 
-            # 英語→日本語翻訳時：直近2件の英語メッセージをコンテキストとして使用
-            context_messages_en = [
-                {"role": msg.role, "content": msg.content_en if msg.content_en else msg.content}
-                for msg in self.chat_history[-2:]
-            ] if len(self.chat_history) > 0 else None
+        status = LLMTaskStatus(
+            task_type="attribute_analysis",
+            status="processing"
+        )
+        task_statuses.append(status)
+        yield status
 
-            response_text = self.translation_service.translate_en_to_ja(
-                response_text_en,
-                context_messages_en if context_messages_en else None
-            )
+        model, metadata = self._select_extraction_model(user_input_en)
+        try:
+            analysis = self.llm.judge_and_extract_all(masters, user_input_en, model=model, metadata=metadata)
+        except ValueError as e:
+            print(f"Warning: 一括判定・抽出に失敗したため属性ごとの処理に切り替えます: {e}")
+            status.status = "failed"
+            yield status
+            return None
+
+        status.status = "completed"
+        yield status
+        return analysis
+
+    def _judge_all(
+        self, masters: list[AttributeMaster], user_input_en: str, task_statuses: list[LLMTaskStatus]
+    ) -> Generator[LLMTaskStatus, None, Optional[dict[str, bool]]]:
+        """全属性の要否を1回のLLM呼び出しで判定する（応答が不正ならNoneを返す）"""
+        if self.attribute_strategy != "batch_judgment" or not masters:
+            return None
 
-            status.status = "completed"
-            self._emit_status(status)
-        else:
-            response_text = response_text_en
+        status = LLMTaskStatus(
+            task_type="judgment_batch",
+            status="processing"
+        )
+        task_statuses.append(status)
+        yield status
 
-        # チャット履歴にアシスタント応答を追加（日本語と英語の両方を保存）
-        self.chat_history.append(ChatMessage(role="assistant", content=response_text, content_en=response_text_en))
+        try:
+            judgments = self.llm.judge_batch(masters, user_input_en)
+        except ValueError as e:
+            print(f"Warning: 一括判定に失敗したため属性ごとの判定に切り替えます: {e}")
+            status.status = "failed"
+            yield status
+            return None
 
-        # === Step 4: 応答を返す（表示は呼び出し側で行う） ===
+        status.status = "completed"
+        yield status
+        return judgments
 
-        # === Step 5: ユーザー入力から属性を抽出・登録 ===
-        extracted_attributes: list[tuple[str, str]] = []
+    def _judge_and_extract(
+        self,
+        master: AttributeMaster,
+        user_input_en: str,
+        model: Optional[str],
+        metadata: Optional[dict],
+        fused_results: dict[str, AttributeAnalysis]
+    ) -> bool:
+        """1つの属性の判定と抽出を1回で行い、抽出結果をfused_resultsに保存（応答が不正なら判定のみ行う）"""
+        try:
+            result = self.llm.judge_and_extract(master, user_input_en, model=model, metadata=metadata)
+        except ValueError as e:
+            print(f"Warning: 属性「{master.attribute_name}」の判定・抽出に失敗したため個別に処理します: {e}")
+            return self.llm.judge(master.judgment_prompt, user_input_en, master.attribute_name)
+        fused_results[master.attribute_name] = result
+        return result.required
+
+    def _run_per_attribute(
+        self,
+        masters: list[AttributeMaster],
+        task_type: str,
+        func: Callable[[AttributeMaster], Any],
+        task_statuses: list[LLMTaskStatus],
+        parallel: bool = True,
+        tolerate_errors: bool = False
+    ) -> Generator[LLMTaskStatus, None, list]:
+        """
+        属性ごとの処理を実行し、完了したものから順にステータスを通知する
 
+        各属性の処理は互いに独立しているため、parallel=Trueならスレッドプールで並行実行する。
+        結果はmastersと同じ順序のリストで返す。
+        tolerate_errors=Trueなら失敗した属性の結果をNoneとし、ターン全体は失敗させない
+        """
+        def run(master: AttributeMaster):
+            try:
+                return func(master), "completed"
+            except (ConnectionError, ValueError) as e:
+                if not tolerate_errors:
+                    raise
+                print(f"Warning: 属性「{master.attribute_name}」の{task_type}に失敗しました: {e}")
+                return None, "failed"
+
+        statuses = []
         for master in masters:
             status = LLMTaskStatus(
-                task_type="attribute_extraction",
+                task_type=task_type,
                 attribute_name=master.attribute_name,
                 status="processing"
             )
             task_statuses.append(status)
-            self._emit_status(status)
-
-            # 英語の入力を使用して属性を抽出
-            extracted = self.llm.extract(master.extraction_prompt, user_input_en, master.attribute_name)
+            statuses.append(status)
+            yield status
 
-            if extracted:
-                # 属性レコードを登録
-                record = AttributeRecord(
-                    sequence_no=None,
-                    attribute_id=master.attribute_id,
-                    content=extracted
-                )
-                self.db.insert_attribute_record(record)
-                extracted_attributes.append((master.attribute_name, extracted))
+        results: list = [None] * len(masters)
+        if not parallel or self.llm_concurrency == 1 or len(masters) <= 1:
+            for i, master in enumerate(masters):
+                results[i], statuses[i].status = run(master)
+                yield statuses[i]
+            return results
+
+        futures = {self._executor.submit(run, master): i for i, master in enumerate(masters)}
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i], statuses[i].status = future.result()
+                yield statuses[i]
+        finally:
+            # クライアントの切断などで途中で終了した場合、まだ始まっていないLLM呼び出しは取り消す
+            for future in futures:
+                future.cancel()
+        return results
 
-            status.status = "completed"
-            self._emit_status(status)
+    def process_user_input(self, user_input: str) -> ChatResponse:
+        """
+        ユーザー入力を処理して応答を生成
 
-        return ChatResponse(
-            response_text=response_text,
-            used_attributes=required_attributes,
-            extracted_attributes=extracted_attributes,
-            task_statuses=task_statuses
-        )
+        Returns:
+            ChatResponse: 応答テキストと処理情報
+        """
+        return self._drain(self._run_pipeline(user_input, streaming=False))
 
     def process_user_input_streaming(
         self, user_input: str
@@ -222,197 +544,238 @@ class ChatService:
         Returns:
             ChatResponse: 最終的な応答
         """
-        task_statuses: list[LLMTaskStatus] = []
-
-        # 翻訳パイプライン: ユーザー入力を英語に翻訳
-        user_input_en = user_input
-        if self.translation_service:
-            status = LLMTaskStatus(
-                task_type="translation_input",
-                status="processing"
-            )
-            task_statuses.append(status)
-            yield status
+        return self._run_pipeline(user_input, streaming=True)
 
-            # 日本語→英語翻訳時：直近2件の英語メッセージをコンテキストとして使用
-            context_messages_en = [
-                {"role": msg.role, "content": msg.content_en}
-                for msg in self.chat_history[-2:]
-                if msg.content_en is not None
-            ] if len(self.chat_history) > 0 else None
+    def _run_pipeline(
+        self, user_input: str, streaming: bool
+    ) -> Generator[LLMTaskStatus, None, ChatResponse]:
+        """
+        翻訳・属性の判定・応答生成・属性の抽出を順に行い、ステータスをyieldする
 
-            user_input_en = self.translation_service.translate_ja_to_en(
-                user_input,
-                context_messages_en if context_messages_en else None
-            )
+        streamingがTrueなら応答の差分（response_delta）と応答準備完了（response_ready）も通知する
+        """
+        task_statuses: list[LLMTaskStatus] = []
 
-            status.status = "completed"
-            yield status
+        # 翻訳パイプライン: ユーザー入力を英語に翻訳
+        user_input_en = yield from self._translate_input(user_input, task_statuses)
 
         # チャット履歴にユーザー入力を追加（日本語と英語の両方を保存）
-        self.chat_history.append(ChatMessage(role="user", content=user_input, content_en=user_input_en))
+        self._append_message(ChatMessage(role="user", content=user_input, content_en=user_input_en))
 
         # === Step 1 & 2: 属性の判定と抽出 ===
-        start_time = datetime.now()
-        print(f"[属性判定] 開始: {start_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}")
-
-        masters = self.db.get_all_attribute_masters()
-        required_attributes: dict[str, str] = {}
-
-        for master in masters:
-            # Step 1: 判定（英語の入力を使用）
-            status = LLMTaskStatus(
-                task_type="judgment",
-                attribute_name=master.attribute_name,
-                status="processing"
-            )
+        start_ns = time.perf_counter_ns()
+        logger.debug("[属性判定] 開始")
+
+        # 前のターンの属性抽出が残っていれば、登録が終わってから判定する
+        self.wait_for_extraction()
+
+        # 同じ状況で同じ入力を受けたことがあれば、判定・応答生成・抽出を省略してその応答を返す
+        # （抽出が失敗なく終わり、何も登録されなかったときだけ保存しているため、抽出も不要）
+        use_cache = self.response_cache_size > 0
+        cache_key = self._response_cache_key(user_input_en, ("records", self.db.master_version, self.db.records_version)) if use_cache else None
+        cached = self._get_cached_response(cache_key) if cache_key is not None else None
+        if cached is not None:
+            response_text, response_text_en, used_attributes = cached
+            status = LLMTaskStatus(task_type="response", status="completed")
             task_statuses.append(status)
             yield status
-
-            judge_start = datetime.now()
-            print(f"[属性判定] 「{master.attribute_name}」判定開始: {judge_start.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}")
-
-            is_required = self.llm.judge(master.judgment_prompt, user_input_en, master.attribute_name)
-
-            judge_end = datetime.now()
-            judge_duration_ms = (judge_end - judge_start).total_seconds() * 1000
-            print(f"[属性判定] 「{master.attribute_name}」判定完了: {judge_end.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (処理時間: {judge_duration_ms:.0f}ms, 結果: {'必要' if is_required else '不要'})")
-
-            status.status = "completed"
-            yield status
-
-            if is_required:
-                # Step 2: 属性データの取得（瞬時に完了するのでステータス表示なし）
-                db_start = datetime.now()
-                content = self.db.get_latest_attribute_content(master.attribute_id)
-                db_end = datetime.now()
-                db_duration_ms = (db_end - db_start).total_seconds() * 1000
-                print(f"[DB取得] 「{master.attribute_name}」取得完了: {db_end.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (処理時間: {db_duration_ms:.0f}ms)")
-                if content:
-                    required_attributes[master.attribute_name] = content
-
-        end_time = datetime.now()
-        total_duration_ms = (end_time - start_time).total_seconds() * 1000
-        print(f"[属性判定] 完了: {end_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (総処理時間: {total_duration_ms:.0f}ms)")
-
-        # === Step 3: 応答文の生成 ===
-        status = LLMTaskStatus(
-            task_type="response",
-            status="processing"
-        )
-        task_statuses.append(status)
-        yield status
-
-        response_start = datetime.now()
-        print(f"[応答生成] 開始: {response_start.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}")
-
-        # チャット履歴を構築（現在のユーザー入力は除外し、それ以前の直近5件を使用）
-        if self.translation_service:
-            history_for_llm = [
-                {"role": msg.role, "content": msg.content_en if msg.content_en else msg.content}
-                for msg in self.chat_history[:-1][-5:]  # 現在の入力を除く直近5件
-            ]
-        else:
-            history_for_llm = [
-                {"role": msg.role, "content": msg.content}
-                for msg in self.chat_history[:-1][-5:]  # 現在の入力を除く直近5件
-            ]
-
-        response_text_en = self.llm.generate_response(
-            chat_history=history_for_llm,
-            user_input=user_input_en,
-            attributes=required_attributes
-        )
-
-        response_end = datetime.now()
-        response_duration_ms = (response_end - response_start).total_seconds() * 1000
-        print(f"[応答生成] 完了: {response_end.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (処理時間: {response_duration_ms:.0f}ms)")
-
-        status.status = "completed"
-        yield status
-
-        # 応答を日本語に翻訳
-        if self.translation_service:
-            status = LLMTaskStatus(
-                task_type="translation_response",
-                status="processing"
-            )
-            task_statuses.append(status)
-            yield status
-
-            # 英語→日本語翻訳時：直近2件の英語メッセージをコンテキストとして使用
-            context_messages_en = [
-                {"role": msg.role, "content": msg.content_en if msg.content_en else msg.content}
-                for msg in self.chat_history[-2:]
-            ] if len(self.chat_history) > 0 else None
-
-            response_text = self.translation_service.translate_en_to_ja(
-                response_text_en,
-                context_messages_en if context_messages_en else None
+            self._append_message(ChatMessage(role="assistant", content=response_text, content_en=response_text_en))
+            if streaming:
+                status = LLMTaskStatus(
+                    task_type="response_ready",
+                    status="completed",
+                    response_text=response_text,
+                    used_attributes=used_attributes
+                )
+                task_statuses.append(status)
+                yield status
+            return ChatResponse(
+                response_text=response_text,
+                used_attributes=used_attributes,
+                extracted_attributes=[],
+                task_statuses=task_statuses
             )
 
-            status.status = "completed"
-            yield status
-        else:
-            response_text = response_text_en
-
-        # チャット履歴にアシスタント応答を追加（日本語と英語の両方を保存）
-        self.chat_history.append(ChatMessage(role="assistant", content=response_text, content_en=response_text_en))
-
-        # 応答準備完了を通知（即座に応答を表示するため）
-        response_ready_status = LLMTaskStatus(
-            task_type="response_ready",
-            status="completed",
-            response_text=response_text,
-            used_attributes=required_attributes
-        )
-        task_statuses.append(response_ready_status)
-        yield response_ready_status
-
-        # === Step 5: 属性抽出・登録 ===
-        extraction_start = datetime.now()
-        print(f"[属性抽出] 開始: {extraction_start.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}")
+        masters = yield from self._load_masters(user_input, task_statuses)
+        required_attributes: dict[str, str] = {}
 
-        extracted_attributes: list[tuple[str, str]] = []
+        # 保存済みの内容がない属性は、必要と判定しても応答に使えないため判定しない
+        # （combined/fusedは判定と同時に抽出も行うため、全属性を対象のままにする）
+        judgment_masters = masters
+        if self.attribute_strategy in ("per_attribute", "batch_judgment") and masters:
+            ids_with_content = self.db.get_attribute_ids_with_content_cached()
+            judgment_masters = [master for master in masters if master.attribute_id in ids_with_content]
+
+        # combined方式では判定と抽出を先にまとめて行う
+        analysis = yield from self._analyze_attributes(masters, user_input_en, task_statuses)
+        # batch_judgment方式では判定だけをまとめて行う
+        batch_judgments = yield from self._judge_all(judgment_masters, user_input_en, task_statuses)
+        # fused方式で判定と同時に得た抽出結果（登録は応答後のStep 5で行う）
+        fused_results: dict[str, AttributeAnalysis] = {}
+        fused = self.attribute_strategy == "fused"
+        model, metadata = self._select_extraction_model(user_input_en)
+
+        # Step 1: 判定（英語の入力を使用）
+        # 属性ごとの判定結果（extract_only_requiredで抽出対象を絞るのに使う）
+        judged_required: dict[str, bool] = {}
+
+        def judge(master: AttributeMaster) -> Optional[str]:
+            judge_start_ns = time.perf_counter_ns()
+            if analysis is not None:
+                is_required = analysis[master.attribute_name].required
+            elif batch_judgments is not None:
+                is_required = batch_judgments[master.attribute_name]
+            elif fused:
+                is_required = self._judge_and_extract(master, user_input_en, model, metadata, fused_results)
+            else:
+                is_required = self.llm.judge(master.judgment_prompt, user_input_en, master.attribute_name)
+
+            logger.debug("[属性判定] 「%s」判定完了 (処理時間: %.0fms, 結果: %s)", master.attribute_name, _elapsed_ms(judge_start_ns), "必要" if is_required else "不要")
+            judged_required[master.attribute_name] = is_required
+            if not is_required:
+                return None
+
+            # Step 2: 属性データの取得（他の属性の判定と並行して行う）
+            db_start_ns = time.perf_counter_ns()
+            content = self.db.get_latest_attribute_content_cached(master.attribute_id)
+            logger.debug("[DB取得] 「%s」取得完了 (処理時間: %.0fms)", master.attribute_name, _elapsed_ms(db_start_ns))
+            return content
+
+        contents = yield from self._run_per_attribute(judgment_masters, "judgment", judge, task_statuses, parallel=analysis is None and batch_judgments is None)
+
+        for master, content in zip(judgment_masters, contents):
+            if content:
+                required_attributes[master.attribute_name] = content
+
+        logger.debug("[属性判定] 完了 (総処理時間: %.0fms)", _elapsed_ms(start_ns))
+
+        # 判定で不要とされた属性は抽出のLLM呼び出しを省略する（combined/fusedでは抽出が判定と同時に済んでいるため絞らない）
+        extraction_masters = masters
+        if self.extract_only_required and analysis is None and not fused:
+            # 内容がなく判定しなかった属性は、新たな情報を登録できるように抽出の対象に残す
+            extraction_masters = [master for master in masters if judged_required.get(master.attribute_name, True)]
+
+        # 抽出結果は今回の応答には使わないため、Step 5の抽出のLLM呼び出しは判定が終わった時点で始め、
+        # 応答の生成・翻訳と並行して進める（同時実行数が1なら従来どおり応答後に逐次実行する）
+        prefetched: dict[str, Future] = {}
+        if analysis is None and self.llm_concurrency > 1:
+            prefetched = {
+                master.attribute_name: self._executor.submit(
+                    self.llm.extract, master.extraction_prompt, user_input_en, master.attribute_name, model=model, metadata=metadata
+                )
+                for master in extraction_masters
+                if master.attribute_name not in fused_results
+            }
 
-        for master in masters:
+        try:
+            # === Step 3: 応答文の生成 ===
             status = LLMTaskStatus(
-                task_type="attribute_extraction",
-                attribute_name=master.attribute_name,
+                task_type="response",
                 status="processing"
             )
             task_statuses.append(status)
             yield status
 
-            extract_start = datetime.now()
-            print(f"[属性抽出] 「{master.attribute_name}」抽出開始: {extract_start.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}")
-
-            # 英語の入力を使用して属性を抽出
-            extracted = self.llm.extract(master.extraction_prompt, user_input_en, master.attribute_name)
-
-            extract_end = datetime.now()
-            extract_duration_ms = (extract_end - extract_start).total_seconds() * 1000
-            print(f"[属性抽出] 「{master.attribute_name}」抽出完了: {extract_end.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (処理時間: {extract_duration_ms:.0f}ms, 結果: {extracted if extracted else 'なし'})")
-
-            if extracted:
-                record = AttributeRecord(
-                    sequence_no=None,
-                    attribute_id=master.attribute_id,
-                    content=extracted
+            # 属性レコードが更新されていても、今回使う属性の内容が同じなら前回の応答を使い回す
+            attributes_key = self._response_cache_key(user_input_en, ("attributes", tuple(required_attributes.items()))) if use_cache else None
+            cached = self._get_cached_response(attributes_key) if attributes_key is not None else None
+            if cached is not None:
+                response_text, response_text_en, _ = cached
+                status.status = "completed"
+                yield status
+            elif streaming and self.stream_translation and self.translation_service:
+                response_start_ns = time.perf_counter_ns()
+                response_text_en, response_text = yield from self._stream_translated_response(user_input_en, required_attributes)
+                logger.debug("[応答生成] 翻訳を含めて完了 (処理時間: %.0fms)", _elapsed_ms(response_start_ns))
+
+                status.status = "completed"
+                yield status
+            else:
+                response_start_ns = time.perf_counter_ns()
+                response_text_en = yield from self._generate_response(user_input_en, required_attributes, streaming)
+                logger.debug("[応答生成] 完了 (処理時間: %.0fms)", _elapsed_ms(response_start_ns))
+
+                status.status = "completed"
+                yield status
+
+                # 応答を日本語に翻訳
+                response_text = yield from self._translate_response(response_text_en, task_statuses)
+
+            if use_cache:
+                # 判定・抽出まで省略できるキャッシュ（cache_key）は、Step 5の抽出が終わってから保存する
+                self._store_cached_response(attributes_key, response_text, response_text_en, required_attributes)
+
+            # チャット履歴にアシスタント応答を追加（日本語と英語の両方を保存）
+            self._append_message(ChatMessage(role="assistant", content=response_text, content_en=response_text_en))
+
+            if streaming:
+                # 応答準備完了を通知（即座に応答を表示するため）
+                response_ready_status = LLMTaskStatus(
+                    task_type="response_ready",
+                    status="completed",
+                    response_text=response_text,
+                    used_attributes=required_attributes
                 )
-                db_insert_start = datetime.now()
-                self.db.insert_attribute_record(record)
-                db_insert_end = datetime.now()
-                db_insert_duration_ms = (db_insert_end - db_insert_start).total_seconds() * 1000
-                print(f"[DB保存] 「{master.attribute_name}」保存完了: {db_insert_end.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (処理時間: {db_insert_duration_ms:.0f}ms)")
-                extracted_attributes.append((master.attribute_name, extracted))
-
-            status.status = "completed"
-            yield status
-
-        extraction_end = datetime.now()
-        extraction_total_duration_ms = (extraction_end - extraction_start).total_seconds() * 1000
-        print(f"[属性抽出] 完了: {extraction_end.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (総処理時間: {extraction_total_duration_ms:.0f}ms)")
+                task_statuses.append(response_ready_status)
+                yield response_ready_status
+
+            # === Step 5: 属性抽出・登録 ===
+            # 英語の入力を使用して属性を抽出（入力の複雑さに応じたモデルを使う）
+            def extract(master: AttributeMaster) -> Optional[str]:
+                extract_start_ns = time.perf_counter_ns()
+                if analysis is not None:
+                    extracted = analysis[master.attribute_name].extracted
+                elif master.attribute_name in fused_results:
+                    extracted = fused_results[master.attribute_name].extracted
+                elif master.attribute_name in prefetched:
+                    extracted = prefetched[master.attribute_name].result()
+                else:
+                    extracted = self.llm.extract(master.extraction_prompt, user_input_en, master.attribute_name, model=model, metadata=metadata)
+
+                logger.debug("[属性抽出] 「%s」抽出完了 (処理時間: %.0fms, 結果: %s)", master.attribute_name, _elapsed_ms(extract_start_ns), extracted or "なし")
+                return extracted
+
+            def extract_and_store(statuses: list[LLMTaskStatus]) -> Generator[LLMTaskStatus, None, list[tuple[str, str]]]:
+                extraction_start_ns = time.perf_counter_ns()
+                first_status = len(statuses)
+                extractions = yield from self._run_per_attribute(extraction_masters, "attribute_extraction", extract, statuses, parallel=analysis is None and not prefetched, tolerate_errors=True)
+                extracted_attributes: list[tuple[str, str]] = []
+                records: list[AttributeRecord] = []
+
+                for master, extracted in zip(extraction_masters, extractions):
+                    if extracted:
+                        records.append(AttributeRecord(
+                            sequence_no=None,
+                            attribute_id=master.attribute_id,
+                            content=extracted
+                        ))
+                        extracted_attributes.append((master.attribute_name, extracted))
+
+                # 抽出できた属性レコードは1トランザクションでまとめて登録
+                db_insert_start_ns = time.perf_counter_ns()
+                inserted = self.db.insert_attribute_records_bulk(records)
+                logger.debug("[DB保存] %d件保存完了 (処理時間: %.0fms)", inserted, _elapsed_ms(db_insert_start_ns))
+
+                # 何も登録されず、失敗した抽出も無かった場合だけ、次回の同じ入力で判定・抽出ごと省略できる
+                # （抽出に失敗した・途中で中断した入力は、次回も抽出し直す）
+                if use_cache and not inserted and all(status.status != "failed" for status in statuses[first_status:]):
+                    self._store_cached_response(cache_key, response_text, response_text_en, required_attributes)
+
+                logger.debug("[属性抽出] 完了 (総処理時間: %.0fms)", _elapsed_ms(extraction_start_ns))
+                return extracted_attributes
+
+            if self.background_extraction:
+                # 抽出結果は応答に含めず、クライアントを待たせないようにバックグラウンドで登録する
+                self._start_background_extraction(extract_and_store([]))
+                extracted_attributes = []
+            else:
+                extracted_attributes = yield from extract_and_store(task_statuses)
+        except BaseException:
+            # クライアントの切断（GeneratorExit）や応答生成の失敗で途中で終了した場合、
+            # 先行して投入した抽出のうち、まだ始まっていないLLM呼び出しは取り消す
+            for future in prefetched.values():
+                future.cancel()
+            raise
 
         return ChatResponse(
             response_text=response_text,
@@ -424,20 +787,21 @@ class ChatService:
     def clear_history(self):
         """チャット履歴をクリア"""
         self.chat_history.clear()
+        self._translation_context.clear()
 
     def get_chat_history(self) -> list[ChatMessage]:
         """チャット履歴を取得"""
-        return self.chat_history.copy()
+        return list(self.chat_history)
 
 
-def create_default_attribute_masters(db: Database):
+def default_attribute_masters() -> list[AttributeMaster]:
     """
-    デフォルトの属性マスタを作成
+    デフォルトの属性マスタの定義
 
     design.md の要望:
     「優秀なアシスタントや秘書が、サポート対象者の情報を分類して記録する仕事を参考に、必要な属性を作成」
     """
-    default_masters = [
+    return [
         AttributeMaster(
             attribute_id=0,
             attribute_name="User Profile",
@@ -464,7 +828,19 @@ def create_default_attribute_masters(db: Database):
         ),
     ]
 
-    for master in default_masters:
-        db.insert_attribute_master(master)
 
-    return len(default_masters)
+def create_default_attribute_masters(db: Database):
+    """デフォルトの属性マスタを作成"""
+    return db.insert_attribute_masters_bulk(default_attribute_masters())
+
+
+def ensure_default_attribute_masters(db: Database, only_if_empty: bool = False) -> int:
+    """未登録のデフォルト属性マスタだけを作成し、作成した件数を返す
+
+    only_if_empty=True の場合は属性マスタが1件もないときだけ作成する（起動時の初期化用）
+    """
+    existing = {master.attribute_name for master in db.get_all_attribute_masters_cached()}
+    if only_if_empty and existing:
+        return 0
+    missing = [master for master in default_attribute_masters() if master.attribute_name not in existing]
+    return db.insert_attribute_masters_bulk(missing)
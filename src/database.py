@@ -2,334 +2,661 @@
 SQLiteデータベース操作
 属性マスタと属性テーブルのCRUD操作
 """
+import dataclasses
+import queue
 import sqlite3
 import threading
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 from .models import AttributeMaster, AttributeRecord, LLMLog
 
 
+# LLMログ一覧で返す列（プロンプト・応答・raw_responseは詳細表示時のみ取得）
+LLM_LOG_SUMMARY_COLUMNS = (
+    "log_id", "timestamp", "sent_at", "received_at", "model", "task_type", "attribute_name", "metadata"
+)
+
+
+@lru_cache(maxsize=1024)
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """ISO形式の日時を解析（登録時のcreated_atとupdated_atは同じ値のため2回目以降は解析を省ける）"""
+    return datetime.fromisoformat(value) if value else None
+
+
 class Database:
-    """SQLiteデータベース管理クラス"""
+    """SQLiteデータベース管理クラス
+
+    書き込み用の接続1本（ロックで直列化）と、読み取り専用接続のプールを管理する。
+    WALモードでは書き込み中も別接続からの読み取りが並行して行えるため、
+    ログ画面などの参照APIがLLMログの書き込みを待たずに済む。
+    インメモリDB（":memory:"）の場合はテスト・開発用として、全スレッドで1本の接続を共有する。
+    """
 
-    def __init__(self, db_path: str = "memory_assistant.db"):
+    def __init__(self, db_path: str = "memory_assistant.db", pool_size: int = 4):
         self.db_path = db_path
-        self._local = threading.local()
+        # インメモリDBは接続ごとに別のDBになるため、読み書きとも1本の接続を共有する
+        self.in_memory = db_path in (":memory:", "")
+        self.pool_size = pool_size  # 読み取り専用接続の最大数
+        self._writer: Optional[sqlite3.Connection] = None  # 書き込み用接続（全スレッドで共有）
+        self._write_lock = threading.RLock()  # 書き込みを直列化するロック
+        self._idle_readers: queue.LifoQueue = queue.LifoQueue()  # 空いている読み取り専用接続
+        self._reader_slots = threading.BoundedSemaphore(pool_size)  # 同時に貸し出せる読み取り接続数
+        self._all_readers: list[sqlite3.Connection] = []  # 作成済みの読み取り専用接続（クローズ用）
+        self._readers_lock = threading.Lock()
+        self._transaction_depth = 0  # transaction()の入れ子の深さ（書き込みロックを持つスレッドのみ変更）
+        self.master_version = 0  # 属性マスタの更新ごとに増えるバージョン番号
+        self._masters_cache: Optional[tuple[int, list[AttributeMaster]]] = None  # (バージョン, 全属性マスタ)
+        self.records_version = 0  # 属性レコードの更新ごとに増えるバージョン番号
+        self._latest_content_cache: dict[int, Optional[str]] = {}  # 属性ID → 最新の属性内容
+        self._latest_content_lock = threading.Lock()
+        self._ids_with_content_cache: Optional[tuple[int, frozenset[int]]] = None  # (records_version, 属性IDの集合)
+
+    def _open_connection(self, read_only: bool = False) -> sqlite3.Connection:
+        """接続を開いてPRAGMAを設定"""
+        if read_only:
+            uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path or ":memory:", check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+
+        # インメモリDBはWALに対応していないためジャーナルモードは変更しない
+        if not read_only and not self.in_memory:
+            # ページサイズは新規のDBファイルでのみ有効（WALにする前に設定する。既存のファイルでは無視される）
+            conn.execute("PRAGMA page_size=8192")
+            # ジャーナルモードはファイルに永続化されるため書き込み用接続でのみ設定
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")  # 負の値はKiB単位（64MiB）
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
 
     def connect(self) -> sqlite3.Connection:
-        """データベース接続を取得（スレッドローカル）"""
-        if not hasattr(self._local, 'connection') or self._local.connection is None:
-            self._local.connection = sqlite3.connect(
-                self.db_path,
-                check_same_thread=False  # マルチスレッド環境での警告を抑制
-            )
-            self._local.connection.row_factory = sqlite3.Row
-        return self._local.connection
+        """書き込み用の接続を取得（全スレッドで共有）"""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open_connection()
+            return self._writer
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """書き込み用の接続を排他的に取得"""
+        with self._write_lock:
+            conn = self.connect()
+            try:
+                yield conn
+            except Exception:
+                # 共有接続に未コミットの変更を残さない
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """複数の書き込みを1回のコミットにまとめる（例外が起きた場合はすべてロールバック）"""
+        with self.write() as conn:
+            if self._transaction_depth == 0 and not conn.in_transaction:
+                # 最初に書き込みロックを取る（読み取りから始めた場合でも、他プロセスの書き込みとは
+                # busy_timeoutの範囲で待ち合わせ、途中で書き込みに昇格するときのSQLITE_BUSYを避ける）
+                conn.execute("BEGIN IMMEDIATE")
+            self._transaction_depth += 1
+            try:
+                yield conn
+            except Exception:
+                # ロールバックされた登録・更新がキャッシュに残らないようにする
+                self.invalidate_masters_cache()
+                self._invalidate_latest_content_cache()
+                raise
+            finally:
+                self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                conn.commit()
+
+    def _commit(self, conn: sqlite3.Connection):
+        """コミット（transaction()の中ではブロックの終了時にまとめてコミットする）"""
+        if self._transaction_depth == 0:
+            conn.commit()
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """読み取り専用の接続をプールから取得"""
+        if self.in_memory:
+            # 共有の1接続を書き込みと同じロックで直列化して使う
+            with self._write_lock:
+                yield self.connect()
+            return
+
+        # 読み取り専用接続はDBファイルが存在しないと開けないため、先に書き込み用接続を開いておく
+        # （開いた後は書き込みロックに触れず、書き込み中・transaction()の中でも待たずに読み取る）
+        if self._writer is None:
+            self.connect()
+        with self._reader_slots:
+            try:
+                conn = self._idle_readers.get_nowait()
+            except queue.Empty:
+                conn = self._open_connection(read_only=True)
+                with self._readers_lock:
+                    self._all_readers.append(conn)
+            try:
+                yield conn
+            finally:
+                self._idle_readers.put(conn)
 
     def close(self):
         """接続をクローズ"""
-        if hasattr(self._local, 'connection') and self._local.connection:
-            self._local.connection.close()
-            self._local.connection = None
+        # 読み取り専用接続を先に閉じ、最後に書き込み用接続を閉じる（WALのチェックポイントを行わせるため）
+        with self._readers_lock:
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers.clear()
+        while True:
+            try:
+                self._idle_readers.get_nowait()
+            except queue.Empty:
+                break
+        with self._write_lock:
+            if self._writer is not None:
+                # 接続中に蓄積したクエリの統計をもとに、必要な場合のみ統計情報を更新する
+                try:
+                    self._writer.execute("PRAGMA optimize")
+                except sqlite3.Error:
+                    pass
+                self._writer.close()
+                self._writer = None
+
+    def maintenance(self):
+        """統計情報の更新とWALファイルの切り詰めを行う（定期的に呼ぶ）"""
+        with self.write() as conn:
+            conn.execute("PRAGMA optimize")
+            if not self.in_memory:
+                # 読み取り中の接続があれば完了しないこともあるが、その場合は次回に持ち越す
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
     def initialize(self):
         """テーブルを作成"""
-        conn = self.connect()
-        cursor = conn.cursor()
-
-        # 属性マスタテーブル
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS attribute_master (
-                attribute_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                attribute_name TEXT NOT NULL,
-                extraction_prompt TEXT NOT NULL,
-                judgment_prompt TEXT NOT NULL
-            )
-        """)
-
-        # 属性テーブル
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS attribute_records (
-                sequence_no INTEGER PRIMARY KEY AUTOINCREMENT,
-                attribute_id INTEGER NOT NULL,
-                content TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                FOREIGN KEY (attribute_id) REFERENCES attribute_master(attribute_id)
-            )
-        """)
-
-        # LLMログテーブル
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS llm_logs (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                sent_at TEXT,
-                received_at TEXT,
-                model TEXT NOT NULL,
-                task_type TEXT NOT NULL,
-                prompt TEXT NOT NULL,
-                response TEXT NOT NULL,
-                raw_response TEXT,
-                attribute_name TEXT,
-                metadata TEXT
-            )
-        """)
-
-        # 既存のテーブルにカラムを追加（マイグレーション）
-        try:
-            cursor.execute("ALTER TABLE llm_logs ADD COLUMN sent_at TEXT")
-        except sqlite3.OperationalError:
-            pass  # カラムが既に存在する場合
-
-        try:
-            cursor.execute("ALTER TABLE llm_logs ADD COLUMN received_at TEXT")
-        except sqlite3.OperationalError:
-            pass  # カラムが既に存在する場合
-
-        conn.commit()
+        with self.write() as conn:
+            cursor = conn.cursor()
+
+            # WALが有効でないと読み取りが書き込みトランザクションを待つことになる
+            journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            if journal_mode.lower() != "wal" and not self.in_memory:
+                print(f"Warning: SQLiteのWALモードを有効にできませんでした（journal_mode={journal_mode}）")
+
+            # 属性マスタテーブル
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS attribute_master (
+                    attribute_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    attribute_name TEXT NOT NULL,
+                    extraction_prompt TEXT NOT NULL,
+                    judgment_prompt TEXT NOT NULL
+                )
+            """)
+
+            # 属性テーブル
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS attribute_records (
+                    sequence_no INTEGER PRIMARY KEY AUTOINCREMENT,
+                    attribute_id INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    FOREIGN KEY (attribute_id) REFERENCES attribute_master(attribute_id)
+                )
+            """)
+
+            # LLMログテーブル
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS llm_logs (
+                    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    sent_at TEXT,
+                    received_at TEXT,
+                    model TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    raw_response TEXT,
+                    attribute_name TEXT,
+                    metadata TEXT
+                )
+            """)
+
+            # 既存のテーブルにカラムを追加（マイグレーション）
+            try:
+                cursor.execute("ALTER TABLE llm_logs ADD COLUMN sent_at TEXT")
+            except sqlite3.OperationalError:
+                pass  # カラムが既に存在する場合
+
+            try:
+                cursor.execute("ALTER TABLE llm_logs ADD COLUMN received_at TEXT")
+            except sqlite3.OperationalError:
+                pass  # カラムが既に存在する場合
+
+            # 属性IDごとの最新レコードの取得をソートなしのインデックス検索にする
+            index_exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_records_attr_seq'"
+            ).fetchone()
+            if not index_exists:
+                cursor.execute("""
+                    CREATE INDEX idx_records_attr_seq
+                    ON attribute_records(attribute_id, sequence_no DESC)
+                """)
+                # 既存のデータに対してもインデックスが選ばれるよう統計情報を作成
+                cursor.execute("ANALYZE attribute_records")
+
+            conn.commit()
 
     # === 属性マスタ操作 ===
 
     def insert_attribute_master(self, master: AttributeMaster) -> int:
         """属性マスタを登録"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO attribute_master (attribute_name, extraction_prompt, judgment_prompt)
-            VALUES (?, ?, ?)
-            """,
-            (master.attribute_name, master.extraction_prompt, master.judgment_prompt)
-        )
-        conn.commit()
-        return cursor.lastrowid
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO attribute_master (attribute_name, extraction_prompt, judgment_prompt)
+                VALUES (?, ?, ?)
+                """,
+                (master.attribute_name, master.extraction_prompt, master.judgment_prompt)
+            )
+            self._commit(conn)
+            self.invalidate_masters_cache()
+            return cursor.lastrowid
+
+    def insert_attribute_masters_bulk(self, masters: list[AttributeMaster]) -> int:
+        """複数の属性マスタを1トランザクションで登録"""
+        if not masters:
+            return 0
+        with self.write() as conn:
+            conn.executemany(
+                """
+                INSERT INTO attribute_master (attribute_name, extraction_prompt, judgment_prompt)
+                VALUES (?, ?, ?)
+                """,
+                [(master.attribute_name, master.extraction_prompt, master.judgment_prompt) for master in masters]
+            )
+            self._commit(conn)
+            self.invalidate_masters_cache()
+            return len(masters)
 
     def get_attribute_master(self, attribute_id: int) -> Optional[AttributeMaster]:
         """属性マスタを取得"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM attribute_master WHERE attribute_id = ?",
-            (attribute_id,)
-        )
-        row = cursor.fetchone()
-        if row:
-            return AttributeMaster(
-                attribute_id=row["attribute_id"],
-                attribute_name=row["attribute_name"],
-                extraction_prompt=row["extraction_prompt"],
-                judgment_prompt=row["judgment_prompt"]
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM attribute_master WHERE attribute_id = ?",
+                (attribute_id,)
             )
-        return None
+            row = cursor.fetchone()
+            if row:
+                return AttributeMaster(
+                    attribute_id=row["attribute_id"],
+                    attribute_name=row["attribute_name"],
+                    extraction_prompt=row["extraction_prompt"],
+                    judgment_prompt=row["judgment_prompt"]
+                )
+            return None
 
     def get_all_attribute_masters(self) -> list[AttributeMaster]:
         """全属性マスタを取得"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM attribute_master ORDER BY attribute_id")
-        rows = cursor.fetchall()
-        return [
-            AttributeMaster(
-                attribute_id=row["attribute_id"],
-                attribute_name=row["attribute_name"],
-                extraction_prompt=row["extraction_prompt"],
-                judgment_prompt=row["judgment_prompt"]
-            )
-            for row in rows
-        ]
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM attribute_master ORDER BY attribute_id")
+            rows = cursor.fetchall()
+            return [
+                AttributeMaster(
+                    attribute_id=row["attribute_id"],
+                    attribute_name=row["attribute_name"],
+                    extraction_prompt=row["extraction_prompt"],
+                    judgment_prompt=row["judgment_prompt"]
+                )
+                for row in rows
+            ]
+
+    def invalidate_masters_cache(self):
+        """属性マスタのキャッシュを無効化（DBを直接書き換えた場合などに呼ぶ）"""
+        self.master_version += 1
+
+    def get_all_attribute_masters_cached(self) -> list[AttributeMaster]:
+        """全属性マスタを取得（前回取得時から更新がなければキャッシュを返す）"""
+        cache = self._masters_cache
+        if cache is None or cache[0] != self.master_version:
+            # 取得前のバージョンで保存し、取得中に更新があれば次回取り直す
+            version = self.master_version
+            cache = (version, self.get_all_attribute_masters())
+            self._masters_cache = cache
+        # 呼び出し側で変更されてもキャッシュに影響しないようコピーを返す
+        return [dataclasses.replace(master) for master in cache[1]]
+
+    def get_attribute_master_cached(self, attribute_id: int) -> Optional[AttributeMaster]:
+        """属性マスタを取得（全属性マスタのキャッシュから探す）"""
+        for master in self.get_all_attribute_masters_cached():
+            if master.attribute_id == attribute_id:
+                return master
+        return None
 
     def update_attribute_master(self, master: AttributeMaster) -> bool:
         """属性マスタを更新"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            UPDATE attribute_master
-            SET attribute_name = ?, extraction_prompt = ?, judgment_prompt = ?
-            WHERE attribute_id = ?
-            """,
-            (
-                master.attribute_name,
-                master.extraction_prompt,
-                master.judgment_prompt,
-                master.attribute_id
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE attribute_master
+                SET attribute_name = ?, extraction_prompt = ?, judgment_prompt = ?
+                WHERE attribute_id = ?
+                """,
+                (
+                    master.attribute_name,
+                    master.extraction_prompt,
+                    master.judgment_prompt,
+                    master.attribute_id
+                )
             )
-        )
-        conn.commit()
-        return cursor.rowcount > 0
+            self._commit(conn)
+            self.invalidate_masters_cache()
+            return cursor.rowcount > 0
 
     def delete_attribute_master(self, attribute_id: int) -> bool:
         """属性マスタを削除"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            "DELETE FROM attribute_master WHERE attribute_id = ?",
-            (attribute_id,)
-        )
-        conn.commit()
-        return cursor.rowcount > 0
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM attribute_master WHERE attribute_id = ?",
+                (attribute_id,)
+            )
+            self._commit(conn)
+            self.invalidate_masters_cache()
+            return cursor.rowcount > 0
 
     # === 属性レコード操作 ===
 
     def insert_attribute_record(self, record: AttributeRecord) -> int:
         """属性レコードを登録"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        cursor.execute(
-            """
-            INSERT INTO attribute_records (attribute_id, content, created_at, updated_at)
-            VALUES (?, ?, ?, ?)
-            """,
-            (record.attribute_id, record.content, now, now)
-        )
-        conn.commit()
-        return cursor.lastrowid
+        with self.write() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute(
+                """
+                INSERT INTO attribute_records (attribute_id, content, created_at, updated_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (record.attribute_id, record.content, now, now)
+            )
+            self._commit(conn)
+            # 登録したレコードがその属性の最新になるため、キャッシュも更新しておく
+            with self._latest_content_lock:
+                self.records_version += 1
+                self._latest_content_cache[record.attribute_id] = record.content
+            return cursor.lastrowid
+
+    def insert_attribute_records_bulk(self, records: list[AttributeRecord]) -> int:
+        """複数の属性レコードを1トランザクションで登録"""
+        if not records:
+            return 0
+        with self.write() as conn:
+            now = datetime.now().isoformat()
+            conn.executemany(
+                """
+                INSERT INTO attribute_records (attribute_id, content, created_at, updated_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(record.attribute_id, record.content, now, now) for record in records]
+            )
+            self._commit(conn)
+            # 同じ属性が複数あれば後に登録したものが最新になる
+            with self._latest_content_lock:
+                self.records_version += 1
+                for record in records:
+                    self._latest_content_cache[record.attribute_id] = record.content
+            return len(records)
 
     def get_attribute_records_by_attribute_id(
         self, attribute_id: int
     ) -> list[AttributeRecord]:
         """属性IDで属性レコードを取得"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT * FROM attribute_records
-            WHERE attribute_id = ?
-            ORDER BY sequence_no DESC
-            """,
-            (attribute_id,)
-        )
-        rows = cursor.fetchall()
-        return [
-            AttributeRecord(
-                sequence_no=row["sequence_no"],
-                attribute_id=row["attribute_id"],
-                content=row["content"],
-                created_at=datetime.fromisoformat(row["created_at"]),
-                updated_at=datetime.fromisoformat(row["updated_at"])
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT * FROM attribute_records
+                WHERE attribute_id = ?
+                ORDER BY sequence_no DESC
+                """,
+                (attribute_id,)
             )
-            for row in rows
-        ]
+            rows = cursor.fetchall()
+            return [
+                AttributeRecord(
+                    sequence_no=row["sequence_no"],
+                    attribute_id=row["attribute_id"],
+                    content=row["content"],
+                    created_at=_parse_datetime(row["created_at"]),
+                    updated_at=_parse_datetime(row["updated_at"])
+                )
+                for row in rows
+            ]
 
     def get_all_attribute_records(self) -> list[AttributeRecord]:
         """全属性レコードを取得"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM attribute_records ORDER BY sequence_no DESC"
-        )
-        rows = cursor.fetchall()
-        return [
-            AttributeRecord(
-                sequence_no=row["sequence_no"],
-                attribute_id=row["attribute_id"],
-                content=row["content"],
-                created_at=datetime.fromisoformat(row["created_at"]),
-                updated_at=datetime.fromisoformat(row["updated_at"])
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM attribute_records ORDER BY sequence_no DESC"
             )
-            for row in rows
-        ]
+            rows = cursor.fetchall()
+            return [
+                AttributeRecord(
+                    sequence_no=row["sequence_no"],
+                    attribute_id=row["attribute_id"],
+                    content=row["content"],
+                    created_at=_parse_datetime(row["created_at"]),
+                    updated_at=_parse_datetime(row["updated_at"])
+                )
+                for row in rows
+            ]
+
+    def get_attribute_records_as_dicts(self, attribute_id: Optional[int] = None) -> list[dict]:
+        """属性レコードを辞書のまま取得（API応答用。日時はISO形式の文字列）"""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            if attribute_id is None:
+                cursor.execute(
+                    "SELECT sequence_no, attribute_id, content, created_at, updated_at "
+                    "FROM attribute_records ORDER BY sequence_no DESC"
+                )
+            else:
+                cursor.execute(
+                    "SELECT sequence_no, attribute_id, content, created_at, updated_at "
+                    "FROM attribute_records WHERE attribute_id = ? ORDER BY sequence_no DESC",
+                    (attribute_id,)
+                )
+            return [dict(row) for row in cursor.fetchall()]
 
     def update_attribute_record(self, record: AttributeRecord) -> bool:
         """属性レコードを更新"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        cursor.execute(
-            """
-            UPDATE attribute_records
-            SET content = ?, updated_at = ?
-            WHERE sequence_no = ?
-            """,
-            (record.content, now, record.sequence_no)
-        )
-        conn.commit()
-        return cursor.rowcount > 0
+        with self.write() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute(
+                """
+                UPDATE attribute_records
+                SET content = ?, updated_at = ?
+                WHERE sequence_no = ?
+                """,
+                (record.content, now, record.sequence_no)
+            )
+            self._commit(conn)
+            self._invalidate_latest_content_cache()
+            return cursor.rowcount > 0
 
     def delete_attribute_record(self, sequence_no: int) -> bool:
         """属性レコードを削除"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            "DELETE FROM attribute_records WHERE sequence_no = ?",
-            (sequence_no,)
-        )
-        conn.commit()
-        return cursor.rowcount > 0
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM attribute_records WHERE sequence_no = ?",
+                (sequence_no,)
+            )
+            self._commit(conn)
+            self._invalidate_latest_content_cache()
+            return cursor.rowcount > 0
 
     def get_latest_attribute_content(self, attribute_id: int) -> Optional[str]:
         """最新の属性内容を取得"""
-        records = self.get_attribute_records_by_attribute_id(attribute_id)
-        if records:
-            return records[0].content
-        return None
+        with self.read() as conn:
+            row = conn.execute(
+                "SELECT content FROM attribute_records "
+                "WHERE attribute_id = ? ORDER BY sequence_no DESC LIMIT 1",
+                (attribute_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_attribute_ids_with_content(self) -> frozenset[int]:
+        """属性レコードが1件以上ある属性IDの集合を取得"""
+        with self.read() as conn:
+            rows = conn.execute("SELECT DISTINCT attribute_id FROM attribute_records").fetchall()
+        return frozenset(row[0] for row in rows)
+
+    def get_attribute_ids_with_content_cached(self) -> frozenset[int]:
+        """属性レコードがある属性IDの集合を取得（属性レコードが更新されるまではキャッシュを返す）"""
+        with self._latest_content_lock:
+            version = self.records_version
+            if self._ids_with_content_cache is not None and self._ids_with_content_cache[0] == version:
+                return self._ids_with_content_cache[1]
+
+        ids = self.get_attribute_ids_with_content()
+        with self._latest_content_lock:
+            # 取得中に更新された場合は古い可能性があるため保存しない
+            if self.records_version == version:
+                self._ids_with_content_cache = (version, ids)
+        return ids
+
+    def _invalidate_latest_content_cache(self):
+        """最新の属性内容のキャッシュを破棄"""
+        with self._latest_content_lock:
+            self.records_version += 1
+            self._latest_content_cache.clear()
+
+    def get_latest_attribute_content_cached(self, attribute_id: int) -> Optional[str]:
+        """最新の属性内容を取得（属性レコードが更新されるまではキャッシュを返す）"""
+        with self._latest_content_lock:
+            if attribute_id in self._latest_content_cache:
+                return self._latest_content_cache[attribute_id]
+            version = self.records_version
+
+        content = self.get_latest_attribute_content(attribute_id)
+        with self._latest_content_lock:
+            # 取得中に更新された場合は古い可能性があるため保存しない
+            if self.records_version == version:
+                self._latest_content_cache[attribute_id] = content
+        return content
 
     # === LLMログ操作 ===
 
+    _INSERT_LLM_LOG_SQL = """
+        INSERT INTO llm_logs (
+            timestamp, sent_at, received_at, model, task_type, prompt, response,
+            raw_response, attribute_name, metadata
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    @staticmethod
+    def _llm_log_params(log: LLMLog) -> tuple:
+        """LLMログをINSERT用のパラメータに変換"""
+        return (
+            log.timestamp.isoformat(),
+            log.sent_at.isoformat() if log.sent_at else None,
+            log.received_at.isoformat() if log.received_at else None,
+            log.model,
+            log.task_type,
+            log.prompt,
+            log.response,
+            log.raw_response,
+            log.attribute_name,
+            log.metadata
+        )
+
     def insert_llm_log(self, log: LLMLog) -> int:
         """LLMログを登録"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO llm_logs (
-                timestamp, sent_at, received_at, model, task_type, prompt, response,
-                raw_response, attribute_name, metadata
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                log.timestamp.isoformat(),
-                log.sent_at.isoformat() if log.sent_at else None,
-                log.received_at.isoformat() if log.received_at else None,
-                log.model,
-                log.task_type,
-                log.prompt,
-                log.response,
-                log.raw_response,
-                log.attribute_name,
-                log.metadata
-            )
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._INSERT_LLM_LOG_SQL, self._llm_log_params(log))
+            self._commit(conn)
+            return cursor.lastrowid
+
+    def insert_llm_logs(self, logs: list[LLMLog]) -> int:
+        """複数のLLMログを1トランザクションで登録"""
+        if not logs:
+            return 0
+        with self.write() as conn:
+            conn.executemany(self._INSERT_LLM_LOG_SQL, [self._llm_log_params(log) for log in logs])
+            self._commit(conn)
+            return len(logs)
+
+    @staticmethod
+    def _row_to_llm_log(row: sqlite3.Row) -> LLMLog:
+        """行をLLMログに変換"""
+        return LLMLog(
+            log_id=row["log_id"],
+            timestamp=_parse_datetime(row["timestamp"]),
+            sent_at=_parse_datetime(row["sent_at"]),
+            received_at=_parse_datetime(row["received_at"]),
+            model=row["model"],
+            task_type=row["task_type"],
+            prompt=row["prompt"],
+            response=row["response"],
+            raw_response=row["raw_response"],
+            attribute_name=row["attribute_name"],
+            metadata=row["metadata"]
         )
-        conn.commit()
-        return cursor.lastrowid
 
-    def get_all_llm_logs(self, limit: Optional[int] = None) -> list[LLMLog]:
+    def get_all_llm_logs(self, limit: Optional[int] = None, offset: int = 0) -> list[LLMLog]:
         """全LLMログを取得（新しい順）"""
-        conn = self.connect()
-        cursor = conn.cursor()
-
-        query = "SELECT * FROM llm_logs ORDER BY log_id DESC"
-        if limit:
-            query += f" LIMIT {limit}"
-
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        return [
-            LLMLog(
-                log_id=row["log_id"],
-                timestamp=datetime.fromisoformat(row["timestamp"]),
-                sent_at=datetime.fromisoformat(row["sent_at"]) if row["sent_at"] else None,
-                received_at=datetime.fromisoformat(row["received_at"]) if row["received_at"] else None,
-                model=row["model"],
-                task_type=row["task_type"],
-                prompt=row["prompt"],
-                response=row["response"],
-                raw_response=row["raw_response"],
-                attribute_name=row["attribute_name"],
-                metadata=row["metadata"]
+        with self.read() as conn:
+            cursor = conn.cursor()
+            # limitがNoneなら全件（LIMITの負の値）。SQL文を1つにして準備済みステートメントを使い回す
+            cursor.execute(
+                "SELECT * FROM llm_logs ORDER BY log_id DESC LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)
+            )
+            return [self._row_to_llm_log(row) for row in cursor.fetchall()]
+
+    def get_llm_logs_page(self, limit: int = 50, offset: int = 0) -> list[dict]:
+        """LLMログの一覧用の要約を1ページ分取得（新しい順）
+
+        プロンプトやraw_responseなどの大きな列は読み込まない（詳細はget_llm_logで取得）
+        """
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(LLM_LOG_SUMMARY_COLUMNS)} FROM llm_logs ORDER BY log_id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
             )
-            for row in rows
-        ]
+            return [dict(row) for row in cursor.fetchall()]
+
+    def count_llm_logs(self) -> int:
+        """LLMログの件数を取得"""
+        with self.read() as conn:
+            return conn.execute("SELECT COUNT(*) FROM llm_logs").fetchone()[0]
+
+    def get_llm_log(self, log_id: int) -> Optional[LLMLog]:
+        """LLMログを1件取得"""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM llm_logs WHERE log_id = ?", (log_id,))
+            row = cursor.fetchone()
+            return self._row_to_llm_log(row) if row else None
 
     def delete_all_llm_logs(self) -> bool:
         """全LLMログを削除"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM llm_logs")
-        conn.commit()
-        return True
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM llm_logs")
+            self._commit(conn)
+            return True
@@ -0,0 +1,151 @@
+"""
+判定・抽出結果のキャッシュ
+
+同じ入力に対する判定・抽出（と翻訳）はLLMを呼び出さずに前回の結果を返す。
+直近の結果はメモリにも保持し、ディスク（SQLite）を読まずに返す。
+キーは (プロバイダー, モデル, プロンプトバージョン, タスク種別, システムプロンプト, 入力) のハッシュ
+"""
+import hashlib
+import json
+import sqlite3
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from .llm_client import LLMResponse
+
+# プロンプトの組み立て方を変更したら上げる（古いキャッシュを無効化するため）
+PROMPT_VERSION = "2"
+
+
+class ExtractionCache:
+    """LLM応答をSQLiteに保存するキャッシュ（cache_dirがNoneならメモリのみ）"""
+
+    def __init__(self, cache_dir: Optional[str] = None, memory_size: int = 1024):
+        self._lock = threading.Lock()
+        self.memory_size = memory_size  # メモリに保持する件数（0でメモリには保持しない）
+        self._memory: OrderedDict[bytes, LLMResponse] = OrderedDict()  # キー → 応答（古いものから破棄）
+        self.stats = {"hits": 0, "misses": 0}  # キャッシュの当たり・外れの回数
+        self.cache_dir: Optional[Path] = None
+        self.db_path: Optional[Path] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        if cache_dir is None:
+            return
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / "extraction_cache.db"
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key BLOB PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def _remember(self, key: bytes, response: LLMResponse):
+        """応答をメモリに保持（ロックを取得して呼ぶ）"""
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def make_key(*components: str) -> bytes:
+        """各要素を長さ付きで連結してハッシュ化（区切り位置の違う入力が衝突しないようにする）"""
+        digest = hashlib.sha256()
+        for component in components:
+            data = component.encode("utf-8")
+            digest.update(struct.pack(">Q", len(data)))
+            digest.update(data)
+        return digest.digest()
+
+    def build_key(self, provider: str, model: str, task_type: str, system: str, prompt: str) -> bytes:
+        """LLM呼び出しの内容からキャッシュキーを作成"""
+        return self.make_key(provider, model, PROMPT_VERSION, task_type, system, prompt)
+
+    def get(self, key: bytes) -> Optional[LLMResponse]:
+        """キャッシュから応答を取得（壊れたエントリは削除してNoneを返す）"""
+        with self._lock:
+            response = self._memory.get(key)
+            if response is not None:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return response
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT response FROM extraction_cache WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+        try:
+            data = json.loads(row[0])
+            if not isinstance(data, dict) or not isinstance(data.get("content"), str):
+                raise ValueError("content がありません")
+        except ValueError:
+            self.delete(key)
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        response = LLMResponse(content=data["content"])
+        with self._lock:
+            self.stats["hits"] += 1
+            self._remember(key, response)
+        return response
+
+    def put(self, key: bytes, response: LLMResponse):
+        """応答をキャッシュに保存（raw_responseは容量が大きいため保存しない）"""
+        with self._lock:
+            self._remember(key, LLMResponse(content=response.content))
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, response, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps({"content": response.content}, ensure_ascii=False), datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def delete(self, key: bytes):
+        """キャッシュエントリを削除"""
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def get_or_compute(self, key: bytes, compute: Callable[[], LLMResponse]) -> LLMResponse:
+        """キャッシュにあればそれを返し、なければ計算して保存"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        response = compute()
+        self.put(key, response)
+        return response
+
+    def clear(self):
+        """全キャッシュを削除"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM extraction_cache")
+            self._conn.commit()
+
+    def close(self):
+        """接続を閉じる"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
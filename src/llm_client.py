@@ -2,14 +2,53 @@
 LLMクライアントインターフェースと実装
 モック実装とOllama実装を提供
 """
+import http.client
 import json
+import queue
 import re
+import time
+import unicodedata
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, Callable
-import urllib.request
-import urllib.error
+from functools import lru_cache
+from typing import Any, Optional, Callable, Iterator, TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from .models import AttributeMaster
+
+try:
+    import orjson
+except ImportError:  # orjson が無い環境では標準の json で代用
+    orjson = None
+
+if TYPE_CHECKING:
+    from .extraction_cache import ExtractionCache
+
+# 応答からJSONオブジェクト部分を取り出す（前後に説明文が付いた場合の対策）
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+# 抽出結果が「なし」を表すか（先頭10文字以内に none / なし を含む）
+_NO_EXTRACTION_RE = re.compile(r"^.{0,6}none|^.{0,8}なし", re.IGNORECASE | re.DOTALL)
+# 判定の応答が「必要」を表すか（小文字化した文字列を作らずに大文字小文字を無視して検索）
+_POSITIVE_ANSWER_RE = re.compile("yes|はい", re.IGNORECASE)
+# 再試行するHTTPステータス（Ollamaは処理待ちのリクエストが上限を超えると503を返す）
+_RETRYABLE_STATUSES = frozenset({502, 503, 504})
+# モックでUser Profile属性の文脈とみなすキーワード（小文字化したプロンプトに対して検索）
+_PROFILE_CONTEXT_RE = re.compile("profile|occupation|job|age|name|プロフィール|職業|仕事|年齢|名前")
+
+
+def _dumps_json(obj: Any) -> bytes:
+    """APIに送るJSONをバイト列で作成（orjsonがあれば使う）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def _loads_json(data: bytes) -> Any:
+    """APIの応答のJSONをバイト列のまま解析（orjsonのJSONDecodeErrorはjson.JSONDecodeErrorのサブクラス）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 @dataclass
@@ -17,6 +56,185 @@ class LLMResponse:
     """LLM応答"""
     content: str
     raw_response: Optional[dict] = None
+    model: Optional[str] = None  # 応答を生成したモデル名
+    metadata: Optional[dict] = None  # ログに残す追加情報（ティアなど）
+
+
+@dataclass
+class AttributeAnalysis:
+    """一括判定・抽出における属性ごとの結果"""
+    required: bool  # 応答に属性が必要か
+    extracted: Optional[str] = None  # ユーザー入力から抽出された内容
+
+
+def normalize_for_cache(text: str) -> str:
+    """キャッシュのキーに使う入力の正規化（全角半角・大文字小文字・空白の違いと文末の句点・感嘆符を無視）"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split()).rstrip("。.! ")
+
+
+def format_conversation(messages: list[dict]) -> str:
+    """会話履歴を「User: ...」「Assistant: ...」の行に整形"""
+    return "".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}\n"
+        for msg in messages
+    )
+
+
+def _parse_required(value) -> bool:
+    """判定結果の値をboolに変換（小規模モデルが文字列で返す場合も受け付ける）"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("yes", "true", "はい"):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ("no", "false", "いいえ"):
+        return False
+    raise ValueError(f"required の値が不正です: {value!r}")
+
+
+def parse_attribute_analysis(text: str, attribute_names: list[str]) -> dict[str, AttributeAnalysis]:
+    """一括判定・抽出のJSON応答を検証して変換（形式が不正な場合はValueError）"""
+    match = _JSON_OBJECT_RE.search(text)
+    if not match:
+        raise ValueError("JSONオブジェクトが見つかりません")
+    data = json.loads(match.group(0))
+    if not isinstance(data, dict):
+        raise ValueError("JSONオブジェクトではありません")
+
+    results: dict[str, AttributeAnalysis] = {}
+    for name in attribute_names:
+        item = data.get(name)
+        if not isinstance(item, dict):
+            raise ValueError(f"属性「{name}」の結果がありません")
+
+        extracted = item.get("extracted")
+        if extracted is not None and not isinstance(extracted, str):
+            raise ValueError(f"属性「{name}」の extracted が文字列ではありません")
+        if extracted is not None:
+            extracted = extracted.strip()
+            if extracted == "" or extracted.lower() == "none" or extracted == "なし":
+                extracted = None
+
+        results[name] = AttributeAnalysis(required=_parse_required(item.get("required")), extracted=extracted)
+    return results
+
+
+def parse_batch_judgment(text: str, attribute_names: list[str]) -> dict[str, bool]:
+    """一括判定のJSON応答を検証して変換（形式が不正な場合はValueError）"""
+    match = _JSON_OBJECT_RE.search(text)
+    if not match:
+        raise ValueError("JSONオブジェクトが見つかりません")
+    data = json.loads(match.group(0))
+    if not isinstance(data, dict):
+        raise ValueError("JSONオブジェクトではありません")
+
+    results: dict[str, bool] = {}
+    for name in attribute_names:
+        if name not in data:
+            raise ValueError(f"属性「{name}」の結果がありません")
+        results[name] = _parse_required(data[name])
+    return results
+
+
+# 応答生成タスクの固定部分（毎回同じバイト列をsystemで渡し、LLM側のプレフィックスキャッシュを効かせる）
+RESPONSE_SYSTEM_PROMPT = """You are a helpful assistant.
+Please generate an appropriate response considering the user's attribute information."""
+
+
+def build_response_prompt(chat_history: list[dict], user_input: str, attributes: dict[str, str]) -> str:
+    """応答生成タスクの可変部分（属性情報・履歴・入力）を組み立てる"""
+    history_text = format_conversation(chat_history[-5:])  # 直近5件
+
+    attributes_text = ""
+    if attributes:
+        attributes_text = "".join(
+            ["<User Attribute Information>\n"]
+            + [f"- {name}: {value}\n" for name, value in attributes.items()]
+            + ["</User Attribute Information>\n\n"]
+        )
+
+    return f"""{attributes_text}<Conversation History>
+{history_text}
+</Conversation History>
+
+<User Input>
+{user_input}
+</User Input>
+
+Response:"""
+
+
+@lru_cache(maxsize=256)
+def build_judgment_system_prompt(judgment_prompt: str) -> str:
+    """判定タスクの固定部分（システムプロンプト）を組み立てる
+
+    属性マスタごとに毎回同じ文字列になるため、組み立て結果をキャッシュし、
+    LLM側のプレフィックスキャッシュ（KVキャッシュ）が効くようにバイト単位で同一に保つ
+    """
+    return f"""You are an assistant that makes judgments.
+Please answer the following question with only 'yes' or 'no'.
+
+<Judgment Question>
+{judgment_prompt}
+</Judgment Question>"""
+
+
+@lru_cache(maxsize=256)
+def build_extraction_system_prompt(extraction_prompt: str) -> str:
+    """抽出タスクの固定部分（システムプロンプト）を組み立てる"""
+    return f"""You are an assistant that extracts information.
+
+<Extraction Instructions>
+{extraction_prompt}
+</Extraction Instructions>
+
+If there is no information to extract, please respond with 'none'."""
+
+
+@lru_cache(maxsize=32)
+def build_attribute_analysis_system_prompt(attributes: tuple[tuple[str, str, str], ...]) -> str:
+    """一括判定・抽出タスクの固定部分を組み立てる（attributes: (属性名, 判定プロンプト, 抽出プロンプト)）"""
+    attribute_blocks = "\n".join(
+        f"""<Attribute name="{name}">
+<Judgment Question>
+{judgment_prompt}
+</Judgment Question>
+<Extraction Instructions>
+{extraction_prompt}
+</Extraction Instructions>
+</Attribute>"""
+        for name, judgment_prompt, extraction_prompt in attributes
+    )
+    return f"""You are an assistant that analyzes user input for each of the attributes below.
+For each attribute:
+- "required": true if answering the user input requires the attribute information (see Judgment Question), otherwise false
+- "extracted": the information extracted from the user input (see Extraction Instructions), or null if there is none
+
+<Attributes>
+{attribute_blocks}
+</Attributes>
+
+Respond only with a JSON object keyed by attribute name, like:
+{{"<attribute name>": {{"required": true, "extracted": null}}}}"""
+
+
+@lru_cache(maxsize=32)
+def build_batch_judgment_system_prompt(attributes: tuple[tuple[str, str], ...]) -> str:
+    """一括判定タスクの固定部分を組み立てる（attributes: (属性名, 判定プロンプト)）"""
+    attribute_blocks = "\n".join(
+        f"""<Attribute name="{name}">
+{judgment_prompt}
+</Attribute>"""
+        for name, judgment_prompt in attributes
+    )
+    return f"""You are an assistant that makes judgments.
+For each attribute below, answer whether answering the user input requires the attribute information (see the question in each attribute).
+
+<Attributes>
+{attribute_blocks}
+</Attributes>
+
+Respond only with a JSON object keyed by attribute name, like:
+{{"<attribute name>": true}}"""
 
 
 class LLMClient(ABC):
@@ -25,19 +243,88 @@ class LLMClient(ABC):
     def __init__(self):
         # ログ記録用コールバック関数 (prompt, response, task_type, attribute_name, sent_at, received_at) -> None
         self.log_callback: Optional[Callable[[str, LLMResponse, str, Optional[str], Optional[datetime], Optional[datetime]], None]] = None
+        # 判定・抽出結果のキャッシュ（未設定なら毎回LLMを呼び出す）
+        self.extraction_cache: Optional["ExtractionCache"] = None
 
     @abstractmethod
-    def generate(self, prompt: str, task_type: str = "general", attribute_name: Optional[str] = None) -> LLMResponse:
-        """プロンプトからテキストを生成"""
+    def generate(self, prompt: str, task_type: str = "general", attribute_name: Optional[str] = None, system: Optional[str] = None, json_mode: bool = False, model: Optional[str] = None, metadata: Optional[dict] = None) -> LLMResponse:
+        """
+        プロンプトからテキストを生成
+
+        system: 呼び出し間で共通の固定部分、json_mode: JSON形式の出力を強制
+        model: 使用するモデル（未指定ならクライアントのデフォルト）、metadata: ログに残す追加情報
+        """
         pass
 
+    def generate_stream(self, prompt: str, task_type: str = "general", system: Optional[str] = None) -> Iterator[str]:
+        """
+        プロンプトからテキストを生成し、生成された部分から順に返す
+
+        ストリーミングに対応していないクライアントでは全文を1回で返す
+        """
+        yield self.generate(prompt, task_type=task_type, system=system).content
+
+    def close(self):
+        """接続などのリソースを解放（必要なクライアントのみオーバーライド）"""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def set_log_callback(self, callback: Callable[[str, LLMResponse, str, Optional[str], Optional[datetime], Optional[datetime]], None]):
         """ログ記録用コールバック関数を設定"""
         self.log_callback = callback
 
-    def _log_interaction(self, prompt: str, response: LLMResponse, task_type: str, attribute_name: Optional[str] = None, sent_at: Optional[datetime] = None, received_at: Optional[datetime] = None):
+    def set_extraction_cache(self, cache: Optional["ExtractionCache"]):
+        """判定・抽出結果のキャッシュを設定"""
+        self.extraction_cache = cache
+
+    def _generate_cached(
+        self,
+        prompt: str,
+        task_type: str,
+        attribute_name: Optional[str],
+        system: Optional[str],
+        json_mode: bool = False,
+        model: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        cache_text: Optional[str] = None
+    ) -> LLMResponse:
+        """キャッシュを経由してgenerateを呼び出す（cache_text: キャッシュキーに使う内容。未指定ならprompt）"""
+        def generate() -> LLMResponse:
+            return self.generate(
+                prompt,
+                task_type=task_type,
+                attribute_name=attribute_name,
+                system=system,
+                json_mode=json_mode,
+                model=model,
+                metadata=metadata
+            )
+
+        if self.extraction_cache is None:
+            return generate()
+        return self.extraction_cache.get_or_compute(self._cache_key(prompt, task_type, system, model, cache_text), generate)
+
+    def _cache_key(self, prompt: str, task_type: str, system: Optional[str], model: Optional[str], cache_text: Optional[str] = None) -> bytes:
+        """判定・抽出結果のキャッシュキー（extraction_cacheが設定されているときだけ呼ぶ）"""
+        return self.extraction_cache.build_key(
+            type(self).__name__,
+            model or getattr(self, "model", ""),
+            task_type,
+            system or "",
+            prompt if cache_text is None else cache_text
+        )
+
+    def _log_interaction(self, prompt: str, response: LLMResponse, task_type: str, attribute_name: Optional[str] = None, sent_at: Optional[datetime] = None, received_at: Optional[datetime] = None, system: Optional[str] = None):
         """ログを記録（コールバックが設定されている場合）"""
         if self.log_callback:
+            # ログにはシステムプロンプトも含めた完全なプロンプトを残す
+            if system:
+                prompt = f"<System>\n{system}\n</System>\n\n{prompt}"
             self.log_callback(prompt, response, task_type, attribute_name, sent_at, received_at)
 
     def judge(self, judgment_prompt: str, user_input: str, attribute_name: Optional[str] = None) -> bool:
@@ -46,86 +333,227 @@ class LLMClient(ABC):
 
         返り値: True = 必要、False = 不要
         """
-        prompt = f"""You are an assistant that makes judgments.
-Please answer the following question with only 'yes' or 'no'.
-
-<Judgment Question>
-{judgment_prompt}
-</Judgment Question>
-
-<User Input>
+        prompt = f"""<User Input>
 {user_input}
 </User Input>
 
 Answer (only 'yes' or 'no'):"""
 
-        response = self.generate(prompt, task_type="judgment", attribute_name=attribute_name)
-        answer = response.content.strip().lower()
-        return "yes" in answer or "はい" in answer
+        response = self._generate_cached(
+            prompt,
+            task_type="judgment",
+            attribute_name=attribute_name,
+            system=build_judgment_system_prompt(judgment_prompt),
+            # はい/いいえの判定は表記の揺れで変わらないため、正規化した入力が同じなら前回の判定を使う
+            cache_text=normalize_for_cache(user_input)
+        )
+        return _POSITIVE_ANSWER_RE.search(response.content) is not None
 
-    def extract(self, extraction_prompt: str, user_input: str, attribute_name: Optional[str] = None) -> Optional[str]:
+    def extract(
+        self,
+        extraction_prompt: str,
+        user_input: str,
+        attribute_name: Optional[str] = None,
+        model: Optional[str] = None,
+        metadata: Optional[dict] = None
+    ) -> Optional[str]:
         """
         抽出タスク: ユーザー入力から情報を抽出
 
         抽出できなかった場合はNoneを返す
         """
-        prompt = f"""You are an assistant that extracts information.
-
-<Extraction Instructions>
-{extraction_prompt}
-</Extraction Instructions>
-
-<User Input>
+        prompt = f"""<User Input>
 {user_input}
 </User Input>
 
-If there is no information to extract, please respond with 'none'.
 Extracted content:"""
 
-        response = self.generate(prompt, task_type="extraction", attribute_name=attribute_name)
+        response = self._generate_cached(
+            prompt,
+            task_type="extraction",
+            attribute_name=attribute_name,
+            system=build_extraction_system_prompt(extraction_prompt),
+            model=model,
+            metadata=metadata
+        )
         content = response.content.strip()
 
-        if content.lower() == "none" or content == "" or "none" in content[:10].lower() or content == "なし" or "なし" in content[:10]:
+        if not content or _NO_EXTRACTION_RE.match(content):
             return None
         return content
 
-    def generate_response(
+    def judge_and_extract_all(
         self,
-        chat_history: list[dict],
+        masters: list[AttributeMaster],
         user_input: str,
-        attributes: dict[str, str]
-    ) -> str:
+        max_retries: int = 2,
+        model: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        retry_backoff: float = 1.0
+    ) -> dict[str, AttributeAnalysis]:
         """
-        応答生成タスク: チャット履歴と属性情報を使って応答を生成
+        一括判定・抽出タスク: 全属性の判定と抽出を1回のLLM呼び出しで行う
+
+        返り値: {属性名: AttributeAnalysis}
+        応答の形式が不正な場合は、エラー内容を伝えて max_retries 回まで再試行し（retry_backoff秒×回数だけ待つ）、
+        それでも失敗したらValueError
         """
-        history_text = ""
-        for msg in chat_history[-5:]:  # 直近5件
-            role = "User" if msg["role"] == "user" else "Assistant"
-            history_text += f"{role}: {msg['content']}\n"
-
-        attributes_text = ""
-        if attributes:
-            attributes_text = "\n<User Attribute Information>\n"
-            for name, value in attributes.items():
-                attributes_text += f"- {name}: {value}\n"
-            attributes_text += "</User Attribute Information>\n"
-
-        prompt = f"""You are a helpful assistant.
-Please generate an appropriate response considering the user's attribute information.
-{attributes_text}
-<Conversation History>
-{history_text}
-</Conversation History>
+        system = build_attribute_analysis_system_prompt(tuple(
+            (master.attribute_name, master.judgment_prompt, master.extraction_prompt)
+            for master in masters
+        ))
+        attribute_names = [master.attribute_name for master in masters]
+        return self._generate_json_with_retry(
+            user_input,
+            system,
+            task_type="attribute_analysis",
+            parse=lambda text: parse_attribute_analysis(text, attribute_names),
+            label="一括判定・抽出",
+            max_retries=max_retries,
+            model=model,
+            metadata=metadata,
+            retry_backoff=retry_backoff
+        )
 
-<User Input>
+    def judge_and_extract(
+        self,
+        master: AttributeMaster,
+        user_input: str,
+        max_retries: int = 2,
+        model: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        retry_backoff: float = 1.0
+    ) -> AttributeAnalysis:
+        """
+        判定・抽出タスク: 1つの属性の判定と抽出を1回のLLM呼び出しで行う
+
+        応答の形式が不正な場合は max_retries 回まで再試行し、それでも失敗したらValueError
+        """
+        system = build_attribute_analysis_system_prompt((
+            (master.attribute_name, master.judgment_prompt, master.extraction_prompt),
+        ))
+        return self._generate_json_with_retry(
+            user_input,
+            system,
+            task_type="judgment_extraction",
+            parse=lambda text: parse_attribute_analysis(text, [master.attribute_name])[master.attribute_name],
+            label=f"属性「{master.attribute_name}」の判定・抽出",
+            attribute_name=master.attribute_name,
+            max_retries=max_retries,
+            model=model,
+            metadata=metadata,
+            retry_backoff=retry_backoff
+        )
+
+    def judge_batch(
+        self,
+        masters: list[AttributeMaster],
+        user_input: str,
+        max_retries: int = 2,
+        retry_backoff: float = 1.0
+    ) -> dict[str, bool]:
+        """
+        一括判定タスク: 全属性の要否を1回のLLM呼び出しで判定
+
+        返り値: {属性名: 必要ならTrue}
+        応答の形式が不正な場合は max_retries 回まで再試行し、それでも失敗したらValueError
+        """
+        system = build_batch_judgment_system_prompt(tuple(
+            (master.attribute_name, master.judgment_prompt) for master in masters
+        ))
+        attribute_names = [master.attribute_name for master in masters]
+        return self._generate_json_with_retry(
+            user_input,
+            system,
+            task_type="judgment_batch",
+            parse=lambda text: parse_batch_judgment(text, attribute_names),
+            label="一括判定",
+            max_retries=max_retries,
+            retry_backoff=retry_backoff
+        )
+
+    def _generate_json_with_retry(
+        self,
+        user_input: str,
+        system: str,
+        task_type: str,
+        parse: Callable[[str], Any],
+        label: str,
+        attribute_name: Optional[str] = None,
+        max_retries: int = 2,
+        model: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        retry_backoff: float = 1.0
+    ) -> Any:
+        """
+        JSON形式の応答を生成して parse で検証する
+
+        形式が不正な場合は、エラー内容を伝えて max_retries 回まで再試行し（retry_backoff秒×回数だけ待つ）、
+        それでも失敗したらValueError
+        """
+        user_block = f"""<User Input>
 {user_input}
 </User Input>
+"""
+        prompt = f"{user_block}\nJSON:"
 
-Response:"""
+        cache = self.extraction_cache
+        from_cache = False
+        for attempt in range(max_retries + 1):
+            # キャッシュから返した応答の再試行ではLLMを待たせていないため、待たない
+            if attempt > 0 and not from_cache:
+                time.sleep(retry_backoff * attempt)
+            # 検証に通った応答だけをキャッシュに保存する（不正な応答を次回以降に使い回さない）
+            key = self._cache_key(prompt, task_type, system, model) if cache is not None else None
+            response = cache.get(key) if cache is not None else None
+            from_cache = response is not None
+            if response is None:
+                response = self.generate(
+                    prompt,
+                    task_type=task_type,
+                    attribute_name=attribute_name,
+                    system=system,
+                    json_mode=True,
+                    model=model,
+                    metadata=dict(metadata or {}, attempt=attempt) if attempt > 0 else metadata
+                )
+            try:
+                result = parse(response.content)
+            except ValueError as e:
+                if from_cache:
+                    cache.delete(key)
+                error = e
+                # エラー内容を伝えて再試行
+                prompt = f"""{user_block}
+Your previous output had an error: {e}. Fix it and respond again with only the JSON object.
+JSON:"""
+                continue
+            if cache is not None and not from_cache:
+                cache.put(key, response)
+            return result
+        raise ValueError(f"{label}の応答が不正です: {error}")
 
-        response = self.generate(prompt, task_type="response")
+    def generate_response(
+        self,
+        chat_history: list[dict],
+        user_input: str,
+        attributes: dict[str, str]
+    ) -> str:
+        """
+        応答生成タスク: チャット履歴と属性情報を使って応答を生成
+        """
+        response = self.generate(build_response_prompt(chat_history, user_input, attributes), task_type="response", system=RESPONSE_SYSTEM_PROMPT)
         return response.content.strip()
 
+    def generate_response_stream(
+        self,
+        chat_history: list[dict],
+        user_input: str,
+        attributes: dict[str, str]
+    ) -> Iterator[str]:
+        """応答生成タスクをストリーミングで実行（生成された部分から順に返す）"""
+        return self.generate_stream(build_response_prompt(chat_history, user_input, attributes), task_type="response", system=RESPONSE_SYSTEM_PROMPT)
+
 
 class MockLLMClient(LLMClient):
     """
@@ -160,17 +588,21 @@ class MockLLMClient(LLMClient):
         """生成応答を追加"""
         self.generate_responses.append(response)
 
-    def generate(self, prompt: str, task_type: str = "general", attribute_name: Optional[str] = None) -> LLMResponse:
+    def generate(self, prompt: str, task_type: str = "general", attribute_name: Optional[str] = None, system: Optional[str] = None, json_mode: bool = False, model: Optional[str] = None, metadata: Optional[dict] = None) -> LLMResponse:
         """モック生成"""
-        self.call_history.append({"type": "generate", "prompt": prompt})
+        self.call_history.append({"type": "generate", "prompt": prompt, "system": system})
+        # パターン判定はシステムプロンプトも含めた全文で行う
+        if system:
+            prompt = f"{system}\n\n{prompt}"
 
         if self.on_generate:
             self.on_generate(prompt)
 
         # 判定プロンプトのパターンをチェック
-        if "「はい」または「いいえ」" in prompt:
+        if "「はい」または「いいえ」" in prompt or "Answer (only 'yes' or 'no'):" in prompt:
+            lowered = prompt.lower()
             for attr_name, response in self.judgment_responses.items():
-                if attr_name in prompt or self._check_attribute_context(prompt, attr_name):
+                if attr_name in prompt or self._check_attribute_context(lowered, attr_name):
                     llm_response = LLMResponse(content="はい" if response else "いいえ")
                     self._log_interaction(prompt, llm_response, task_type, attribute_name)
                     return llm_response
@@ -179,9 +611,10 @@ class MockLLMClient(LLMClient):
             return llm_response
 
         # 抽出プロンプトのパターンをチェック
-        if "抽出された内容:" in prompt:
+        if "抽出された内容:" in prompt or "Extracted content:" in prompt:
+            lowered = prompt.lower()
             for attr_name, response in self.extraction_responses.items():
-                if attr_name in prompt or self._check_attribute_context(prompt, attr_name):
+                if attr_name in prompt or self._check_attribute_context(lowered, attr_name):
                     llm_response = LLMResponse(content=response if response else "なし")
                     self._log_interaction(prompt, llm_response, task_type, attribute_name)
                     return llm_response
@@ -201,12 +634,11 @@ class MockLLMClient(LLMClient):
         self._log_interaction(prompt, llm_response, task_type, attribute_name)
         return llm_response
 
-    def _check_attribute_context(self, prompt: str, attr_name: str) -> bool:
-        """プロンプトに属性のコンテキストが含まれているか確認"""
+    def _check_attribute_context(self, lowered_prompt: str, attr_name: str) -> bool:
+        """プロンプトに属性のコンテキストが含まれているか確認（プロンプトは小文字化済みのものを渡す）"""
         # User Profile判定パターン
-        if "user profile" in attr_name.lower() or "プロフィール" in attr_name.lower():
-            patterns = ["profile", "occupation", "job", "age", "name", "プロフィール", "職業", "仕事", "年齢", "名前"]
-            return any(p in prompt.lower() for p in patterns)
+        if "user profile" in attr_name.lower() or "プロフィール" in attr_name:
+            return _PROFILE_CONTEXT_RE.search(lowered_prompt) is not None
         return False
 
     def judge(self, judgment_prompt: str, user_input: str, attribute_name: Optional[str] = None) -> bool:
@@ -225,7 +657,14 @@ class MockLLMClient(LLMClient):
         # デフォルトの判定ロジック
         return super().judge(judgment_prompt, user_input, attribute_name)
 
-    def extract(self, extraction_prompt: str, user_input: str, attribute_name: Optional[str] = None) -> Optional[str]:
+    def extract(
+        self,
+        extraction_prompt: str,
+        user_input: str,
+        attribute_name: Optional[str] = None,
+        model: Optional[str] = None,
+        metadata: Optional[dict] = None
+    ) -> Optional[str]:
         """モック抽出"""
         self.call_history.append({
             "type": "extract",
@@ -239,7 +678,84 @@ class MockLLMClient(LLMClient):
                 return response
 
         # デフォルトの抽出ロジック
-        return super().extract(extraction_prompt, user_input, attribute_name)
+        return super().extract(extraction_prompt, user_input, attribute_name, model=model, metadata=metadata)
+
+    def judge_and_extract_all(
+        self,
+        masters: list[AttributeMaster],
+        user_input: str,
+        max_retries: int = 2,
+        model: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        retry_backoff: float = 1.0
+    ) -> dict[str, AttributeAnalysis]:
+        """モック一括判定・抽出"""
+        self.call_history.append({
+            "type": "judge_and_extract_all",
+            "attribute_names": [master.attribute_name for master in masters],
+            "user_input": user_input
+        })
+
+        results: dict[str, AttributeAnalysis] = {}
+        for master in masters:
+            required = next(
+                (response for attr_name, response in self.judgment_responses.items() if attr_name in master.judgment_prompt),
+                False
+            )
+            extracted = next(
+                (response for attr_name, response in self.extraction_responses.items() if attr_name in master.extraction_prompt),
+                None
+            )
+            results[master.attribute_name] = AttributeAnalysis(required=required, extracted=extracted)
+        return results
+
+    def judge_and_extract(
+        self,
+        master: AttributeMaster,
+        user_input: str,
+        max_retries: int = 2,
+        model: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        retry_backoff: float = 1.0
+    ) -> AttributeAnalysis:
+        """モック判定・抽出"""
+        self.call_history.append({
+            "type": "judge_and_extract",
+            "attribute_name": master.attribute_name,
+            "user_input": user_input
+        })
+
+        required = next(
+            (response for attr_name, response in self.judgment_responses.items() if attr_name in master.judgment_prompt),
+            False
+        )
+        extracted = next(
+            (response for attr_name, response in self.extraction_responses.items() if attr_name in master.extraction_prompt),
+            None
+        )
+        return AttributeAnalysis(required=required, extracted=extracted)
+
+    def judge_batch(
+        self,
+        masters: list[AttributeMaster],
+        user_input: str,
+        max_retries: int = 2,
+        retry_backoff: float = 1.0
+    ) -> dict[str, bool]:
+        """モック一括判定"""
+        self.call_history.append({
+            "type": "judge_batch",
+            "attribute_names": [master.attribute_name for master in masters],
+            "user_input": user_input
+        })
+
+        return {
+            master.attribute_name: next(
+                (response for attr_name, response in self.judgment_responses.items() if attr_name in master.judgment_prompt),
+                False
+            )
+            for master in masters
+        }
 
     def reset(self):
         """状態をリセット"""
@@ -251,52 +767,275 @@ class MockLLMClient(LLMClient):
 
 
 class OllamaClient(LLMClient):
-    """Ollama API クライアント"""
+    """Ollama API クライアント
+
+    HTTP/1.1のkeep-alive接続をプールして再利用し、呼び出しごとの接続確立を省く
+    """
 
     def __init__(
         self,
         base_url: str = "http://localhost:11434",
-        model: str = "llama3.1:8b"
+        model: str = "llama3.1:8b",
+        timeout: float = 60,
+        max_idle_connections: int = 8,
+        keep_alive: Optional[str] = None,
+        max_retries: int = 2,
+        retry_backoff: float = 1.0
     ):
         super().__init__()
         self.base_url = base_url.rstrip("/")
         self.model = model
+        self.timeout = timeout
+        # モデルをメモリに保持する時間（例: "30m", "-1"で無期限）。アンロードされると固定部分のKVキャッシュも失われる
+        self.keep_alive = keep_alive
+        # サーバーが混雑している（503など）場合の再試行回数と待ち時間（retry_backoff秒×回数）
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
 
-    def generate(self, prompt: str, task_type: str = "general", attribute_name: Optional[str] = None) -> LLMResponse:
-        """Ollama APIを呼び出してテキストを生成"""
-        url = f"{self.base_url}/api/generate"
+        parsed = urlsplit(self.base_url)
+        self._connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port
+        self._base_path = parsed.path
+        # 再利用可能なアイドル接続（スレッドごとに1本ずつ取り出して使う）
+        self._idle_connections: queue.LifoQueue = queue.LifoQueue(maxsize=max_idle_connections)
+
+    def _acquire_connection(self) -> tuple[http.client.HTTPConnection, bool]:
+        """アイドル接続を取り出す（なければ新規作成）。返り値: (接続, 再利用かどうか)"""
+        try:
+            return self._idle_connections.get_nowait(), True
+        except queue.Empty:
+            return self._connection_class(self._host, self._port, timeout=self.timeout), False
+
+    def _release_connection(self, connection: http.client.HTTPConnection):
+        """接続をアイドルプールに戻す（満杯なら閉じる）"""
+        try:
+            self._idle_connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _should_retry(self, status: int, attempt: int) -> bool:
+        """一時的なエラー応答なら待ってから再試行する（再試行する場合はTrue）"""
+        if status not in _RETRYABLE_STATUSES or attempt >= self.max_retries:
+            return False
+        time.sleep(self.retry_backoff * (attempt + 1))
+        return True
+
+    def _post_json(self, path: str, payload: dict) -> dict:
+        """APIにJSONをPOSTして応答のJSONを返す"""
+        body = _dumps_json(payload)
+        headers = {"Content-Type": "application/json"}
+
+        attempt = 0
+        while True:
+            connection, reused = self._acquire_connection()
+            try:
+                connection.request("POST", self._base_path + path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                connection.close()
+                if reused:
+                    # サーバー側で切断済みの古い接続だった場合は新しい接続でやり直す
+                    continue
+                raise ConnectionError(f"Ollama API接続エラー: {e}")
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise ConnectionError(f"Ollama API接続エラー: {e}")
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release_connection(connection)
 
-        data = json.dumps({
-            "model": self.model,
+            if response.status >= 400:
+                if self._should_retry(response.status, attempt):
+                    attempt += 1
+                    continue
+                raise ConnectionError(f"Ollama API接続エラー: HTTP {response.status} {response.reason}")
+
+            try:
+                return _loads_json(data)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Ollama API応答パースエラー: {e}")
+
+    def _build_payload(self, prompt: str, model: str, system: Optional[str], stream: bool) -> dict:
+        """/api/generateに送るリクエストを組み立てる"""
+        payload = {
+            "model": model,
             "prompt": prompt,
-            "stream": False
-        }).encode("utf-8")
-
-        request = urllib.request.Request(
-            url,
-            data=data,
-            headers={"Content-Type": "application/json"},
-            method="POST"
+            "stream": stream
+        }
+        if system:
+            # 固定部分はsystemで渡し、呼び出し間でプロンプト先頭を同一に保つ
+            payload["system"] = system
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def generate(self, prompt: str, task_type: str = "general", attribute_name: Optional[str] = None, system: Optional[str] = None, json_mode: bool = False, model: Optional[str] = None, metadata: Optional[dict] = None) -> LLMResponse:
+        """Ollama APIを呼び出してテキストを生成"""
+        model = model or self.model
+        payload = self._build_payload(prompt, model, system, stream=False)
+        if json_mode:
+            payload["format"] = "json"
+
+        # 送信時刻を記録（ミリ秒精度）
+        sent_at = datetime.now()
+
+        result = self._post_json("/api/generate", payload)
+
+        # 受信時刻を記録（ミリ秒精度）
+        received_at = datetime.now()
+
+        llm_response = LLMResponse(
+            content=result.get("response", ""),
+            raw_response=result,
+            model=model,
+            metadata=metadata
         )
+        # ログを記録
+        self._log_interaction(prompt, llm_response, task_type, attribute_name, sent_at, received_at, system=system)
+        return llm_response
+
+    def generate_stream(self, prompt: str, task_type: str = "general", system: Optional[str] = None) -> Iterator[str]:
+        """Ollama APIをストリーミングモードで呼び出し、生成された部分から順に返す"""
+        payload = self._build_payload(prompt, self.model, system, stream=True)
+        body = _dumps_json(payload)
+        headers = {"Content-Type": "application/json"}
 
+        sent_at = datetime.now()
+        attempt = 0
+        while True:
+            connection, reused = self._acquire_connection()
+            try:
+                connection.request("POST", self._base_path + "/api/generate", body=body, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                connection.close()
+                if reused:
+                    continue
+                raise ConnectionError(f"Ollama API接続エラー: {e}")
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise ConnectionError(f"Ollama API接続エラー: {e}")
+
+            if response.status < 400:
+                break
+            connection.close()
+            if not self._should_retry(response.status, attempt):
+                raise ConnectionError(f"Ollama API接続エラー: HTTP {response.status} {response.reason}")
+            attempt += 1
+
+        chunks: list[str] = []
+        final: dict = {}
+        completed = False
         try:
-            # 送信時刻を記録（ミリ秒精度）
-            sent_at = datetime.now()
+            # 1行に1つのJSONオブジェクトが届く（最後の行は "done": true）
+            for line in response:
+                if not line.strip():
+                    continue
+                try:
+                    data = _loads_json(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Ollama API応答パースエラー: {e}")
+                chunk = data.get("response", "")
+                if chunk:
+                    chunks.append(chunk)
+                    yield chunk
+                if data.get("done"):
+                    final = data
+                    break
+            completed = True
+        except (OSError, http.client.HTTPException) as e:
+            raise ConnectionError(f"Ollama API接続エラー: {e}")
+        finally:
+            # 途中で終了した接続は残りの応答が読めないため再利用しない
+            if completed and not response.will_close and response.read() == b"":
+                self._release_connection(connection)
+            else:
+                connection.close()
 
-            with urllib.request.urlopen(request, timeout=60) as response:
-                result = json.loads(response.read().decode("utf-8"))
+        llm_response = LLMResponse(content="".join(chunks), raw_response=final, model=self.model)
+        self._log_interaction(prompt, llm_response, task_type, None, sent_at, datetime.now(), system=system)
 
-                # 受信時刻を記録（ミリ秒精度）
-                received_at = datetime.now()
+    def close(self):
+        """アイドル接続をすべて閉じる"""
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except queue.Empty:
+                break
 
-                llm_response = LLMResponse(
-                    content=result.get("response", ""),
-                    raw_response=result
+
+class FallbackLLMClient(LLMClient):
+    """
+    複数のLLMクライアントを順に試すクライアント
+
+    先頭のクライアントが接続エラーなどで失敗した場合に、次のクライアントで同じ呼び出しをやり直す。
+    応答遅延の小さいローカルのクライアントを先頭に置く
+    """
+
+    def __init__(self, clients: list[LLMClient]):
+        super().__init__()
+        if not clients:
+            raise ValueError("クライアントを1つ以上指定してください")
+        self.clients = clients
+
+    @property
+    def model(self) -> str:
+        """先頭のクライアントのモデル名"""
+        return getattr(self.clients[0], "model", "")
+
+    def set_log_callback(self, callback: Callable[[str, LLMResponse, str, Optional[str], Optional[datetime], Optional[datetime]], None]):
+        """ログ記録用コールバック関数を設定（実際に呼び出す各クライアントに設定する）"""
+        super().set_log_callback(callback)
+        for client in self.clients:
+            client.set_log_callback(callback)
+
+    def generate(self, prompt: str, task_type: str = "general", attribute_name: Optional[str] = None, system: Optional[str] = None, json_mode: bool = False, model: Optional[str] = None, metadata: Optional[dict] = None) -> LLMResponse:
+        """先頭のクライアントから順に生成を試す"""
+        failures: list[str] = []
+        for client in self.clients:
+            call_metadata = metadata
+            if failures:
+                # どのクライアントが失敗したかをログに残す
+                call_metadata = dict(metadata or {}, provider_failed=list(failures))
+            try:
+                return client.generate(
+                    prompt,
+                    task_type=task_type,
+                    attribute_name=attribute_name,
+                    system=system,
+                    json_mode=json_mode,
+                    model=model,
+                    metadata=call_metadata
                 )
-                # ログを記録
-                self._log_interaction(prompt, llm_response, task_type, attribute_name, sent_at, received_at)
-                return llm_response
-        except urllib.error.URLError as e:
-            raise ConnectionError(f"Ollama API接続エラー: {e}")
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Ollama API応答パースエラー: {e}")
+            except (ConnectionError, TimeoutError, ValueError) as e:
+                name = getattr(client, "base_url", type(client).__name__)
+                print(f"Warning: LLMクライアント {name} の呼び出しに失敗しました: {e}")
+                failures.append(name)
+                last_error = e
+        raise ConnectionError(f"すべてのLLMクライアントの呼び出しに失敗しました: {last_error}")
+
+    def generate_stream(self, prompt: str, task_type: str = "general", system: Optional[str] = None) -> Iterator[str]:
+        """先頭のクライアントから順にストリーミング生成を試す（出力が始まった後の失敗はそのまま送出）"""
+        for client in self.clients:
+            started = False
+            try:
+                for chunk in client.generate_stream(prompt, task_type=task_type, system=system):
+                    started = True
+                    yield chunk
+                return
+            except (ConnectionError, TimeoutError, ValueError) as e:
+                if started:
+                    raise
+                name = getattr(client, "base_url", type(client).__name__)
+                print(f"Warning: LLMクライアント {name} の呼び出しに失敗しました: {e}")
+                last_error = e
+        raise ConnectionError(f"すべてのLLMクライアントの呼び出しに失敗しました: {last_error}")
+
+    def close(self):
+        """すべてのクライアントのリソースを解放"""
+        for client in self.clients:
+            client.close()
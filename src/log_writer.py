@@ -0,0 +1,113 @@
+"""
+LLMログの非同期書き込み
+
+LLM呼び出しのたびにSQLiteへ同期的に書き込むと、チャットの応答時間に
+ディスク同期のコストが加算されるため、キュー経由でまとめて書き込む
+"""
+import queue
+import threading
+import time
+from typing import Optional
+
+from .database import Database
+from .models import LLMLog
+
+# 書き込みスレッドの停止を指示する番兵
+_STOP = object()
+
+
+class LogWriter:
+    """LLMログをバックグラウンドスレッドでまとめて書き込むクラス"""
+
+    def __init__(self, database: Database, batch_size: int = 100, flush_interval: float = 0.05):
+        self.db = database
+        self.batch_size = batch_size  # 1トランザクションで書き込む最大件数
+        self.flush_interval = flush_interval  # 1件目を受け取ってから後続のログを待つ最大秒数
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """書き込みスレッドを開始"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+            self._thread.start()
+
+    def put(self, log: LLMLog):
+        """ログを書き込みキューに追加（ブロックしない）"""
+        self._queue.put_nowait(log)
+
+    def flush(self, timeout: Optional[float] = 5.0):
+        """キューに積まれたログがすべて書き込まれるまで待つ（最大timeout秒）"""
+        if self._thread is None or not self._thread.is_alive():
+            # stop()の後やfork後の子プロセスでは書き込みスレッドが無いため、この場で書き込む
+            self._write_pending()
+            return
+        with self._queue.all_tasks_done:
+            self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def _write_pending(self):
+        """キューに残っているログを呼び出し元のスレッドで書き込む"""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.task_done()
+            else:
+                batch.append(item)
+        if not batch:
+            return
+        try:
+            self.db.insert_llm_logs(batch)
+        except Exception as e:
+            print(f"Warning: LLMログの書き込みに失敗しました ({len(batch)}件): {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """残りのログを書き込んでからスレッドを停止"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        """キューからログを取り出してまとめて書き込む"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+
+            batch = [item]
+            stop_requested = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop_requested = True
+                    break
+                batch.append(item)
+
+            try:
+                self.db.insert_llm_logs(batch)
+            except Exception as e:
+                # ログの書き込み失敗でチャット処理を止めない
+                print(f"Warning: LLMログの書き込みに失敗しました ({len(batch)}件): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if stop_requested:
+                self._queue.task_done()
+                return
@@ -2,12 +2,17 @@
 データベースモデル定義
 属性マスタと属性テーブルを管理
 """
+import sys
 from dataclasses import dataclass, field
 from datetime import datetime
+from functools import cached_property, lru_cache
 from typing import Optional
 
+# 頻繁に生成するデータクラスは__slots__を使い、インスタンスごとの__dict__を持たない（Python 3.10以降のみ）
+DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(**DATACLASS_SLOTS)
 class AttributeMaster:
     """属性マスタ
 
@@ -27,7 +32,7 @@ class AttributeMaster:
             raise ValueError("判定プロンプトは必須です")
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class AttributeRecord:
     """属性テーブル
 
@@ -44,7 +49,7 @@ class AttributeRecord:
             raise ValueError("内容は必須です")
 
 
-@dataclass
+@dataclass(frozen=True)
 class ChatMessage:
     """チャットメッセージ
 
@@ -55,31 +60,56 @@ class ChatMessage:
     content_en: Optional[str] = None  # 英語コンテンツ
     timestamp: datetime = field(default_factory=datetime.now)
 
-
-@dataclass
+    @cached_property
+    def llm_dict(self) -> dict:
+        """LLMに渡す形式（英語があれば英語）。メッセージは変更されないため1回だけ作成する"""
+        return {"role": self.role, "content": self.content_en if self.content_en else self.content}
+
+    @cached_property
+    def content_dict(self) -> dict:
+        """LLMに渡す形式（日本語コンテンツ）"""
+        return {"role": self.role, "content": self.content}
+
+
+# タスク種別ごとのステータス表示用テキスト（{attribute_name}は属性名に置き換える）
+_TASK_DESCRIPTIONS = {
+    "translation_input": "ユーザー入力を英語に翻訳中",
+    "translation_skipped": "翻訳が不要なため省略",
+    "skip_extraction": "属性情報を含まない入力のため判定・抽出を省略",
+    "attribute_analysis": "全属性の要否判定と抽出を一括処理中",
+    "judgment_batch": "全属性が応答に必要か一括判定中",
+    "judgment": "属性「{attribute_name}」が応答に必要か判定中",
+    "response": "応答文を生成中",
+    "response_delta": "応答文を生成中",
+    "translation_response": "応答を日本語に翻訳中",
+    "response_ready": "応答準備完了",
+    "attribute_extraction": "ユーザー入力から「{attribute_name}」を抽出中",
+}
+
+
+@lru_cache(maxsize=256)
+def _format_display_text(task_type: str, attribute_name: Optional[str]) -> str:
+    """ステータス表示用テキストを作成（タスク種別と属性名の組み合わせごとに1回だけ整形する）"""
+    template = _TASK_DESCRIPTIONS.get(task_type, "処理中")
+    return template.format(attribute_name=attribute_name) if "{" in template else template
+
+
+@dataclass(**DATACLASS_SLOTS)
 class LLMTaskStatus:
     """LLMタスクのステータス"""
-    task_type: str  # "translation_input", "judgment", "response", "translation_response", "response_ready", "attribute_extraction"
+    task_type: str  # "translation_input", "translation_skipped", "skip_extraction", "attribute_analysis", "judgment_batch", "judgment", "response", "response_delta", "translation_response", "response_ready", "attribute_extraction"
     attribute_name: Optional[str] = None
     status: str = "processing"  # "processing", "completed", "failed"
-    response_text: Optional[str] = None  # "response_ready"タイプの場合に応答テキストを含む
+    response_text: Optional[str] = None  # "response_ready"タイプの場合に応答テキスト、"response_delta"タイプの場合に生成された部分を含む
     used_attributes: Optional[dict] = None  # "response_ready"タイプの場合に使用された属性を含む
 
     @property
     def display_text(self) -> str:
         """ステータス表示用テキスト"""
-        task_descriptions = {
-            "translation_input": "ユーザー入力を英語に翻訳中",
-            "judgment": f"属性「{self.attribute_name}」が応答に必要か判定中",
-            "response": "応答文を生成中",
-            "translation_response": "応答を日本語に翻訳中",
-            "response_ready": "応答準備完了",
-            "attribute_extraction": f"ユーザー入力から「{self.attribute_name}」を抽出中",
-        }
-        return task_descriptions.get(self.task_type, "処理中")
-
-
-@dataclass
+        return _format_display_text(self.task_type, self.attribute_name)
+
+
+@dataclass(**DATACLASS_SLOTS)
 class LLMLog:
     """LLMリクエスト/レスポンスログ"""
     log_id: Optional[int]
@@ -2,25 +2,139 @@
 翻訳サービス
 LLMを使用して日本語と英語の翻訳を行う
 """
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from typing import Optional
-from datetime import datetime
-from .llm_client import LLMClient
+from .extraction_cache import ExtractionCache
+from .llm_client import LLMClient, format_conversation
+
+# ひらがな・カタカナ・漢字・半角カタカナ
+_JAPANESE_CHAR_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff66-\uff9f]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+# 翻訳の処理時間ログ（DEBUGレベルが有効なときだけ文字列に整形される）
+logger = logging.getLogger(__name__)
+
+
+def is_japanese(text: str, min_ratio: float = 0.05) -> bool:
+    """空白を除いた文字のうち日本語の文字が min_ratio 以上含まれるか"""
+    chars = _WHITESPACE_RE.sub("", text)
+    if not chars:
+        return False
+    return len(_JAPANESE_CHAR_RE.findall(chars)) / len(chars) >= min_ratio
+
+
+def is_mostly_japanese(text: str, min_ratio: float = 0.5) -> bool:
+    """文字（英字・日本語など）のうち日本語の文字が min_ratio 以上か（英文中の日本語の人名・単語では真にならない）"""
+    letters = sum(1 for ch in text if ch.isalpha())
+    if not letters:
+        return False
+    return len(_JAPANESE_CHAR_RE.findall(text)) / letters >= min_ratio
+
+
+def has_letters(text: str) -> bool:
+    """文字（英字・日本語など）を含むか（数字・記号・絵文字のみの文章は翻訳しても変わらない）"""
+    return any(ch.isalpha() for ch in text)
+
+
+# 翻訳タスクの固定部分（毎回同じバイト列をsystemで渡し、LLM側のプレフィックスキャッシュを効かせる）
+JA_TO_EN_SYSTEM_PROMPT = "Translate the Japanese text to English. Output only the translation."
+EN_TO_JA_SYSTEM_PROMPT = "Translate the English text to Japanese. Output only the translation."
+
+# 翻訳するテキストを囲むプロンプト（直近の会話コンテキスト, 翻訳するテキスト）
+_JA_TO_EN_PROMPT = "%s<Japanese Text>\n%s\n</Japanese Text>"
+_EN_TO_JA_PROMPT = "%s<English Text>\n%s\n</English Text>"
+
+
+def format_translation_context(context_messages: Optional[list[dict]]) -> str:
+    """翻訳プロンプトに付ける直近の会話（直近2つのメッセージ）。同じコンテキストで何度も翻訳するときは一度だけ組み立てて使い回す"""
+    if not context_messages:
+        return ""
+    return f"<Recent Conversation Context>\n{format_conversation(context_messages[-2:])}</Recent Conversation Context>\n\n"
 
 
 class TranslationService:
     """LLMを使用した翻訳サービス"""
 
-    def __init__(self, llm_client: LLMClient):
+    def __init__(self, llm_client: LLMClient, cache_size: int = 256, persistent_cache: Optional[ExtractionCache] = None):
         """
         Args:
             llm_client: 翻訳に使用するLLMクライアント
+            cache_size: 翻訳結果をメモリに保持する件数（0でキャッシュしない）
+            persistent_cache: 翻訳結果をディスクに保存するキャッシュ（再起動後も同じ翻訳でLLMを呼ばない）
         """
         self.llm_client = llm_client
+        self.persistent_cache = persistent_cache
+        # 同じ文章・同じコンテキストの翻訳結果（古いものから破棄）
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # LLMに依頼中の翻訳（同じ翻訳を同時に依頼されたら、先の依頼の結果を待って共有する）
+        self._in_flight: dict[tuple[str, str], Future] = {}
+
+    def _translate(self, prompt: str, task_type: str, system: str) -> str:
+        """翻訳をLLMに依頼（同じプロンプトの翻訳はキャッシュ・依頼中の結果から返す）"""
+        key = (task_type, prompt)
+        with self._cache_lock:
+            if self.cache_size > 0:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return cached
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return future.result()
+
+        try:
+            translated = self._generate(prompt, task_type, system)
+        except Exception as e:
+            with self._cache_lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._cache_lock:
+            del self._in_flight[key]
+            if self.cache_size > 0:
+                self._cache[key] = translated
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        future.set_result(translated)
+        return translated
+
+    def _generate(self, prompt: str, task_type: str, system: str) -> str:
+        """翻訳をLLMに依頼（persistent_cacheがあればディスクに保存した結果を優先）"""
+        def generate():
+            return self.llm_client.generate(prompt, task_type=task_type, system=system)
+
+        if self.persistent_cache is None:
+            return generate().content.strip()
+        key = self.persistent_cache.build_key(
+            type(self.llm_client).__name__,
+            getattr(self.llm_client, "model", ""),
+            task_type,
+            system,
+            prompt
+        )
+        return self.persistent_cache.get_or_compute(key, generate).content.strip()
 
     def translate_ja_to_en(
         self,
         text: str,
-        context_messages: Optional[list[dict]] = None
+        context_messages: Optional[list[dict]] = None,
+        *,
+        context_text: Optional[str] = None
     ) -> str:
         """
         日本語から英語に翻訳
@@ -29,39 +143,33 @@ class TranslationService:
             text: 翻訳する日本語テキスト
             context_messages: 直近のメッセージ履歴（翻訳精度向上のため）
                              [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
+            context_text: format_translation_context で組み立て済みのコンテキスト（指定時はcontext_messagesより優先）
 
         Returns:
             翻訳された英語テキスト
         """
-        start_time = datetime.now()
-        print(f"[翻訳] 日本語→英語 開始: {start_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}")
+        # 日本語の文字を含まない文章は翻訳しても変わらないため、LLMを呼ばない
+        if not text.strip() or not _JAPANESE_CHAR_RE.search(text):
+            return text.strip()
 
-        context_text = ""
-        if context_messages:
-            context_text = "\n<Recent Conversation Context>\n"
-            for msg in context_messages[-2:]:  # 直近2つのメッセージ
-                role = "User" if msg["role"] == "user" else "Assistant"
-                context_text += f"{role}: {msg['content']}\n"
-            context_text += "</Recent Conversation Context>\n\n"
+        start_ns = time.perf_counter_ns()
 
-        prompt = f"""Translate the Japanese text to English. Output only the translation.
-{context_text}
-<Japanese Text>
-{text}
-</Japanese Text>"""
+        if context_text is None:
+            context_text = format_translation_context(context_messages)
+        prompt = _JA_TO_EN_PROMPT % (context_text, text)
 
-        response = self.llm_client.generate(prompt, task_type="translation_ja_to_en")
+        translated = self._translate(prompt, "translation_ja_to_en", JA_TO_EN_SYSTEM_PROMPT)
 
-        end_time = datetime.now()
-        duration_ms = (end_time - start_time).total_seconds() * 1000
-        print(f"[翻訳] 日本語→英語 完了: {end_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (処理時間: {duration_ms:.0f}ms)")
+        logger.debug("[翻訳] 日本語→英語 完了 (処理時間: %.0fms)", (time.perf_counter_ns() - start_ns) / 1e6)
 
-        return response.content.strip()
+        return translated
 
     def translate_en_to_ja(
         self,
         text: str,
-        context_messages: Optional[list[dict]] = None
+        context_messages: Optional[list[dict]] = None,
+        *,
+        context_text: Optional[str] = None
     ) -> str:
         """
         英語から日本語に翻訳
@@ -70,31 +178,23 @@ class TranslationService:
             text: 翻訳する英語テキスト
             context_messages: 直近のメッセージ履歴（翻訳精度向上のため）
                              [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
+            context_text: format_translation_context で組み立て済みのコンテキスト（指定時はcontext_messagesより優先）
 
         Returns:
             翻訳された日本語テキスト
         """
-        start_time = datetime.now()
-        print(f"[翻訳] 英語→日本語 開始: {start_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}")
-
-        context_text = ""
-        if context_messages:
-            context_text = "\n<Recent Conversation Context>\n"
-            for msg in context_messages[-2:]:  # 直近2つのメッセージ
-                role = "User" if msg["role"] == "user" else "Assistant"
-                context_text += f"{role}: {msg['content']}\n"
-            context_text += "</Recent Conversation Context>\n\n"
-
-        prompt = f"""Translate the English text to Japanese. Output only the translation.
-{context_text}
-<English Text>
-{text}
-</English Text>"""
-
-        response = self.llm_client.generate(prompt, task_type="translation_en_to_ja")
-
-        end_time = datetime.now()
-        duration_ms = (end_time - start_time).total_seconds() * 1000
-        print(f"[翻訳] 英語→日本語 完了: {end_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} (処理時間: {duration_ms:.0f}ms)")
-
-        return response.content.strip()
+        # 既に日本語の文章・文字を含まない文章は、LLMを呼ばずにそのまま返す
+        if is_mostly_japanese(text) or not has_letters(text):
+            return text.strip()
+
+        start_ns = time.perf_counter_ns()
+
+        if context_text is None:
+            context_text = format_translation_context(context_messages)
+        prompt = _EN_TO_JA_PROMPT % (context_text, text)
+
+        translated = self._translate(prompt, "translation_en_to_ja", EN_TO_JA_SYSTEM_PROMPT)
+
+        logger.debug("[翻訳] 英語→日本語 完了 (処理時間: %.0fms)", (time.perf_counter_ns() - start_ns) / 1e6)
+
+        return translated
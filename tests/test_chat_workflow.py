@@ -8,19 +8,29 @@ design.md に記載された以下のフローをテスト:
 4. 画面にチャットの応答を表示
 5. 応答の表示が完了したら、ユーザーの入力から属性を抽出・登録
 """
+import json
 import os
+import sqlite3
 import sys
 import tempfile
+import threading
+import time
 import unittest
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # srcディレクトリをパスに追加
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.models import AttributeMaster, AttributeRecord, LLMTaskStatus
+from src.models import AttributeMaster, AttributeRecord, ChatMessage, LLMLog, LLMTaskStatus
 from src.database import Database
-from src.llm_client import MockLLMClient
-from src.chat_service import ChatService, create_default_attribute_masters
+from src.log_writer import LogWriter
+from src.translation_service import TranslationService, format_translation_context, is_japanese, is_mostly_japanese
+from src.extraction_cache import ExtractionCache
+from src.llm_client import FallbackLLMClient, LLMClient, MockLLMClient, OllamaClient, parse_attribute_analysis, parse_batch_judgment
+from src.chat_service import (
+    ChatService, MAX_TIER, create_default_attribute_masters, ensure_default_attribute_masters, parse_tier_models, select_tier
+)
 
 
 class TestDatabaseOperations(unittest.TestCase):
@@ -102,6 +112,217 @@ class TestDatabaseOperations(unittest.TestCase):
         deleted = self.db.get_attribute_records_by_attribute_id(master_id)
         self.assertEqual(len(deleted), 0)
 
+    def test_attribute_masters_cache(self):
+        """属性マスタのキャッシュは更新時のみ取り直される"""
+        master_id = self.db.insert_attribute_master(AttributeMaster(
+            attribute_id=0,
+            attribute_name="プロフィール",
+            extraction_prompt="プロフィールを抽出",
+            judgment_prompt="プロフィールが必要か"
+        ))
+        cached = self.db.get_all_attribute_masters_cached()
+        self.assertEqual(cached[0].attribute_name, "プロフィール")
+
+        # 返されたオブジェクトを変更してもキャッシュには影響しない
+        cached[0].attribute_name = "変更"
+        self.assertEqual(self.db.get_all_attribute_masters_cached()[0].attribute_name, "プロフィール")
+
+        # 更新するとキャッシュが取り直される
+        master = self.db.get_attribute_master(master_id)
+        master.attribute_name = "更新された属性"
+        self.db.update_attribute_master(master)
+        self.assertEqual(self.db.get_all_attribute_masters_cached()[0].attribute_name, "更新された属性")
+        self.assertEqual(self.db.get_attribute_master_cached(master_id).attribute_name, "更新された属性")
+        self.assertIsNone(self.db.get_attribute_master_cached(master_id + 1))
+
+        # DBを直接書き換えた場合は明示的に無効化する
+        with self.db.write() as conn:
+            conn.execute("UPDATE attribute_master SET attribute_name = '直接更新'")
+            conn.commit()
+        self.assertEqual(self.db.get_all_attribute_masters_cached()[0].attribute_name, "更新された属性")
+        self.db.invalidate_masters_cache()
+        self.assertEqual(self.db.get_all_attribute_masters_cached()[0].attribute_name, "直接更新")
+
+    def test_latest_attribute_content_cache(self):
+        """最新の属性内容のキャッシュは登録・更新・削除に追従する"""
+        attribute_id = self.db.insert_attribute_master(AttributeMaster(
+            attribute_id=0, attribute_name="プロフィール", extraction_prompt="抽出", judgment_prompt="判定"
+        ))
+        self.assertIsNone(self.db.get_latest_attribute_content_cached(attribute_id))
+
+        self.db.insert_attribute_record(AttributeRecord(sequence_no=None, attribute_id=attribute_id, content="エンジニア"))
+        sequence_no = self.db.insert_attribute_record(AttributeRecord(sequence_no=None, attribute_id=attribute_id, content="マネージャー"))
+        self.assertEqual(self.db.get_latest_attribute_content_cached(attribute_id), "マネージャー")
+
+        self.db.delete_attribute_record(sequence_no)
+        self.assertEqual(self.db.get_latest_attribute_content_cached(attribute_id), "エンジニア")
+
+    def test_maintenance(self):
+        """保守処理の後もデータを読み書きできる"""
+        self.db.insert_llm_log(LLMLog(log_id=None, timestamp=datetime.now(), model="mock", task_type="response", prompt="p", response="r"))
+        self.db.maintenance()
+        self.assertEqual(self.db.count_llm_logs(), 1)
+        self.assertEqual(os.path.getsize(self.temp_file.name + "-wal"), 0)
+
+    def test_read_pool_from_other_thread(self):
+        """別スレッドの読み取り専用接続から書き込み結果が参照できる"""
+        master_id = self.db.insert_attribute_master(AttributeMaster(
+            attribute_id=0,
+            attribute_name="プロフィール",
+            extraction_prompt="プロフィールを抽出",
+            judgment_prompt="プロフィールが必要か"
+        ))
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.db.get_attribute_master(master_id)))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(results[0].attribute_name, "プロフィール")
+
+        # 読み取り専用接続からは書き込めない
+        with self.db.read() as conn:
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM attribute_master")
+
+    def test_log_writer_batches_logs(self):
+        """LogWriter経由のLLMログがまとめて書き込まれる"""
+        writer = LogWriter(self.db)
+        writer.start()
+        for i in range(5):
+            writer.put(LLMLog(
+                log_id=None,
+                timestamp=datetime.now(),
+                model="mock",
+                task_type="response",
+                prompt=f"プロンプト{i}",
+                response=f"応答{i}"
+            ))
+        writer.stop()
+
+        logs = self.db.get_all_llm_logs()
+        self.assertEqual(len(logs), 5)
+        self.assertEqual({log.prompt for log in logs}, {f"プロンプト{i}" for i in range(5)})
+
+    def test_log_writer_flush_without_thread(self):
+        """書き込みスレッドが動いていなくても、flush()は待ち続けずにその場で書き込む"""
+        writer = LogWriter(self.db)
+        writer.start()
+        writer.stop()
+        writer.put(LLMLog(log_id=None, timestamp=datetime.now(), model="mock", task_type="response", prompt="p", response="r"))
+
+        writer.flush()
+        self.assertEqual(self.db.count_llm_logs(), 1)
+
+    def test_llm_logs_page(self):
+        """LLMログの一覧は要約列のみをページ単位で返し、詳細は1件ずつ取得できる"""
+        self.db.insert_llm_logs([
+            LLMLog(log_id=None, timestamp=datetime.now(), model="mock", task_type="response",
+                   prompt=f"プロンプト{i}", response=f"応答{i}", raw_response='{"context": [1, 2, 3]}')
+            for i in range(5)
+        ])
+
+        page = self.db.get_llm_logs_page(limit=2, offset=2)
+        self.assertEqual(len(page), 2)
+        self.assertNotIn("prompt", page[0])
+        self.assertNotIn("raw_response", page[0])
+        self.assertEqual(self.db.count_llm_logs(), 5)
+
+        detail = self.db.get_llm_log(page[0]["log_id"])
+        self.assertEqual(detail.prompt, "プロンプト2")
+        self.assertEqual([log.prompt for log in self.db.get_all_llm_logs(limit=2, offset=1)], ["プロンプト3", "プロンプト2"])
+        self.assertEqual(len(self.db.get_all_llm_logs(offset=3)), 2)
+        self.assertEqual(self.db.get_all_llm_logs(limit=0), [])
+        self.assertIsNone(self.db.get_llm_log(999))
+
+    def test_in_memory_database_shares_connection(self):
+        """インメモリDBでは別スレッドからの読み取りでも同じDBが見える"""
+        db = Database(":memory:")
+        db.initialize()
+        db.insert_attribute_master(AttributeMaster(
+            attribute_id=0, attribute_name="プロフィール", extraction_prompt="抽出", judgment_prompt="判定"
+        ))
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(db.get_all_attribute_masters()))
+        thread.start()
+        thread.join()
+        db.close()
+
+        self.assertEqual([m.attribute_name for m in results[0]], ["プロフィール"])
+
+    def test_attribute_records_as_dicts(self):
+        """属性レコードを辞書で取得でき、属性IDで絞り込める"""
+        attribute_id = self.db.insert_attribute_master(AttributeMaster(
+            attribute_id=0, attribute_name="プロフィール", extraction_prompt="抽出", judgment_prompt="判定"
+        ))
+        self.db.insert_attribute_record(AttributeRecord(sequence_no=None, attribute_id=attribute_id, content="名前: 太郎"))
+
+        records = self.db.get_attribute_records_as_dicts()
+        self.assertEqual(records[0]["content"], "名前: 太郎")
+        self.assertIsInstance(records[0]["created_at"], str)
+        self.assertEqual(len(self.db.get_attribute_records_as_dicts(attribute_id)), 1)
+        self.assertEqual(self.db.get_attribute_records_as_dicts(attribute_id + 1), [])
+
+    def test_insert_attribute_records_bulk(self):
+        """複数の属性レコードをまとめて登録でき、後に登録した内容が最新になる"""
+        attribute_id = self.db.insert_attribute_master(AttributeMaster(
+            attribute_id=0, attribute_name="プロフィール", extraction_prompt="抽出", judgment_prompt="判定"
+        ))
+        inserted = self.db.insert_attribute_records_bulk([
+            AttributeRecord(sequence_no=None, attribute_id=attribute_id, content="名前: 太郎"),
+            AttributeRecord(sequence_no=None, attribute_id=attribute_id, content="名前: 次郎"),
+        ])
+
+        self.assertEqual(inserted, 2)
+        self.assertEqual(self.db.insert_attribute_records_bulk([]), 0)
+        self.assertEqual(len(self.db.get_attribute_records_by_attribute_id(attribute_id)), 2)
+        self.assertEqual(self.db.get_latest_attribute_content(attribute_id), "名前: 次郎")
+        self.assertEqual(self.db.get_latest_attribute_content_cached(attribute_id), "名前: 次郎")
+
+    def test_transaction(self):
+        """transaction()内の書き込みはまとめてコミットされ、例外時はすべて取り消される"""
+        attribute_id = self.db.insert_attribute_master(AttributeMaster(
+            attribute_id=0, attribute_name="プロフィール", extraction_prompt="抽出", judgment_prompt="判定"
+        ))
+        with self.db.transaction():
+            self.db.insert_attribute_record(AttributeRecord(sequence_no=None, attribute_id=attribute_id, content="名前: 太郎"))
+            self.db.insert_llm_log(LLMLog(log_id=None, timestamp=datetime.now(), model="mock", task_type="extraction", prompt="p", response="r"))
+        self.assertEqual(self.db.get_latest_attribute_content(attribute_id), "名前: 太郎")
+        self.assertEqual(self.db.count_llm_logs(), 1)
+
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.insert_attribute_record(AttributeRecord(sequence_no=None, attribute_id=attribute_id, content="名前: 次郎"))
+                raise RuntimeError("中断")
+        self.assertEqual(self.db.get_latest_attribute_content(attribute_id), "名前: 太郎")
+        self.assertEqual(self.db.get_latest_attribute_content_cached(attribute_id), "名前: 太郎")
+
+    def test_read_during_write_transaction(self):
+        """書き込みトランザクションの実行中も、読み取りは書き込みの完了を待たない"""
+        self.db.insert_llm_log(LLMLog(log_id=None, timestamp=datetime.now(), model="mock", task_type="extraction", prompt="p", response="r"))
+        started = threading.Event()
+        release = threading.Event()
+
+        def write():
+            with self.db.transaction():
+                self.db.insert_llm_log(LLMLog(log_id=None, timestamp=datetime.now(), model="mock", task_type="extraction", prompt="p", response="r"))
+                started.set()
+                release.wait(5)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            started.wait(5)
+            start = time.perf_counter()
+            # 未コミットの書き込みは見えない
+            self.assertEqual(self.db.count_llm_logs(), 1)
+            self.assertLess(time.perf_counter() - start, 1)
+        finally:
+            release.set()
+            writer.join()
+        self.assertEqual(self.db.count_llm_logs(), 2)
+
 
 class TestMockLLMClient(unittest.TestCase):
     """MockLLMClientのテスト"""
@@ -145,6 +366,180 @@ class TestMockLLMClient(unittest.TestCase):
         self.assertEqual(self.mock.call_history[2]["type"], "extract")
         self.assertEqual(self.mock.call_history[3]["type"], "generate")
 
+    def test_extraction_cache_skips_llm_call(self):
+        """同じ入力の抽出はキャッシュから返され、LLMを再度呼び出さない"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ExtractionCache(cache_dir)
+            self.mock.set_extraction_cache(cache)
+
+            result1 = self.mock.extract("Extract the user's favorite food", "I love sushi")
+            result2 = self.mock.extract("Extract the user's favorite food", "I love sushi")
+            cache.close()
+
+        generate_calls = [h for h in self.mock.call_history if h["type"] == "generate"]
+        self.assertEqual(len(generate_calls), 1)
+        self.assertEqual(result1, result2)
+
+    def test_invalid_json_response_is_not_cached(self):
+        """形式が不正なJSON応答はキャッシュせず、次回の同じ入力ではLLMに再度依頼する"""
+        self.mock.set_extraction_cache(ExtractionCache())
+        masters = [AttributeMaster(attribute_id=1, attribute_name="趣味", extraction_prompt="趣味", judgment_prompt="趣味")]
+        self.mock.add_generate_response("not json")
+        self.mock.add_generate_response('{"趣味": true}')
+        self.mock.add_generate_response('{"趣味": false}')
+
+        # 基底クラスの実装（JSON応答の検証と再試行）を使う
+        self.assertEqual(LLMClient.judge_batch(self.mock, masters, "I like tennis", retry_backoff=0), {"趣味": True})
+        self.assertEqual(LLMClient.judge_batch(self.mock, masters, "I like tennis", retry_backoff=0), {"趣味": False})
+        # 検証に通った応答はキャッシュから返す
+        self.assertEqual(LLMClient.judge_batch(self.mock, masters, "I like tennis", retry_backoff=0), {"趣味": False})
+
+        generate_calls = [h for h in self.mock.call_history if h["type"] == "generate"]
+        self.assertEqual(len(generate_calls), 3)
+
+    def test_translation_persistent_cache(self):
+        """翻訳結果はディスクのキャッシュに保存され、再起動後も LLM を呼ばずに返す"""
+        self.mock.add_generate_response("Hello")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ExtractionCache(cache_dir)
+            self.assertEqual(TranslationService(self.mock, persistent_cache=cache).translate_ja_to_en("こんにちは"), "Hello")
+            cache.close()
+
+            # メモリのキャッシュが空の状態（再起動後）でもディスクから返す
+            cache = ExtractionCache(cache_dir)
+            self.assertEqual(TranslationService(self.mock, persistent_cache=cache).translate_ja_to_en("こんにちは"), "Hello")
+            cache.close()
+
+        self.assertEqual(len(self.mock.call_history), 1)
+
+    def test_memory_only_extraction_cache(self):
+        """保存先を指定しない場合はメモリのみにキャッシュし、古いものから破棄する"""
+        cache = ExtractionCache(memory_size=1)
+        self.mock.set_extraction_cache(cache)
+
+        self.mock.judge("Is the user's profile needed?", "I am an engineer")
+        self.mock.judge("Is the user's profile needed?", "I am an engineer")
+        self.mock.judge("Is the user's profile needed?", "I am a teacher")
+        self.mock.judge("Is the user's profile needed?", "I am an engineer")
+
+        generate_calls = [h for h in self.mock.call_history if h["type"] == "generate"]
+        self.assertEqual(len(generate_calls), 3)
+        self.assertEqual(cache.stats, {"hits": 1, "misses": 3})
+
+        # 判定は表記の揺れ（大文字小文字・全角半角・文末の句点）を無視してキャッシュを使う
+        self.mock.judge("Is the user's profile needed?", "ｉ am an ENGINEER.")
+        self.assertEqual(cache.stats["hits"], 2)
+
+
+class TestOllamaClient(unittest.TestCase):
+    """OllamaClientのテスト（ローカルの疑似サーバーを使用）"""
+
+    def setUp(self):
+        client_ports = self.client_ports = []
+        payloads = self.payloads = []
+        busy_responses = self.busy_responses = []  # 先頭から順に返す混雑時のステータス
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                client_ports.append(self.client_address[1])
+                payloads.append(payload)
+                if busy_responses:
+                    self.send_response(busy_responses.pop(0))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if payload.get("stream"):
+                    # ストリーミングは1行に1つのJSON（単語ごと）を返す
+                    lines = [{"response": word, "done": False} for word in ["echo:", f" {payload['prompt']}"]]
+                    lines.append({"response": "", "done": True})
+                    body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+                else:
+                    body = json.dumps({"response": f"echo: {payload['prompt']}"}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        # shutdown()はserve_foreverのポーリング間隔だけ待つため、短くしてテストの待ち時間を減らす
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+        self.client = OllamaClient(base_url=f"http://127.0.0.1:{self.server.server_address[1]}", model="test")
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_is_reused(self):
+        """連続した呼び出しで同じkeep-alive接続が再利用される"""
+        response1 = self.client.generate("one")
+        response2 = self.client.generate("two")
+
+        self.assertEqual(response1.content, "echo: one")
+        self.assertEqual(response2.content, "echo: two")
+        self.assertEqual(len(set(self.client_ports)), 1)
+
+        # withブロックを抜けるとアイドル接続が閉じられる
+        with self.client as client:
+            client.generate("three")
+        self.assertTrue(self.client._idle_connections.empty())
+
+    def test_retry_when_server_busy(self):
+        """サーバーが混雑している（503）場合は待ってから再試行し、回数を超えたら接続エラー"""
+        self.client.retry_backoff = 0
+        self.busy_responses.extend([503, 503])
+        self.assertEqual(self.client.generate("one").content, "echo: one")
+
+        self.busy_responses.extend([503, 503, 503])
+        with self.assertRaises(ConnectionError):
+            list(self.client.generate_stream("two"))
+
+    def test_system_prompt_and_keep_alive(self):
+        """固定部分はsystemで渡し、keep_aliveを指定した場合はリクエストに含める"""
+        self.client.generate("one", system="固定部分")
+        self.client.keep_alive = "30m"
+        list(self.client.generate_stream("two", system="固定部分"))
+
+        self.assertEqual(self.payloads[0]["system"], "固定部分")
+        self.assertNotIn("keep_alive", self.payloads[0])
+        self.assertEqual(self.payloads[1]["keep_alive"], "30m")
+
+    def test_generate_stream(self):
+        """ストリーミング生成で部分ごとに返され、全文がログに残り、接続も再利用される"""
+        logs = []
+        self.client.set_log_callback(lambda prompt, response, *args: logs.append(response.content))
+
+        chunks = list(self.client.generate_stream("one", task_type="response"))
+        response = self.client.generate("two")
+
+        self.assertEqual(chunks, ["echo:", " one"])
+        self.assertEqual(logs, ["echo: one", "echo: two"])
+        self.assertEqual(response.content, "echo: two")
+        self.assertEqual(len(set(self.client_ports)), 1)
+
+
+class TestFallbackLLMClient(unittest.TestCase):
+    """FallbackLLMClientのテスト"""
+
+    def test_falls_back_to_next_client(self):
+        """先頭のクライアントが接続エラーなら次のクライアントで生成する"""
+        # 接続できないポートを指定
+        unreachable = OllamaClient(base_url="http://127.0.0.1:9", timeout=1)
+        mock = MockLLMClient()
+        mock.add_generate_response("代替クライアントの応答")
+        client = FallbackLLMClient([unreachable, mock])
+
+        response = client.generate("テスト")
+
+        self.assertEqual(response.content, "代替クライアントの応答")
+
 
 class TestChatWorkflow(unittest.TestCase):
     """チャットワークフローのテスト"""
@@ -195,6 +590,11 @@ class TestChatWorkflow(unittest.TestCase):
 
     def test_workflow_step1_judgment(self):
         """Step 1: 属性の判定テスト"""
+        # 判定は保存済みの内容がある属性だけが対象
+        self.db.insert_attribute_records_bulk([
+            AttributeRecord(sequence_no=None, attribute_id=self.profile_id, content="エンジニア"),
+            AttributeRecord(sequence_no=None, attribute_id=self.hobby_id, content="登山"),
+        ])
         # プロフィールが必要と判定されるように設定
         self.mock_llm.set_judgment_response("プロフィール", True)
         self.mock_llm.set_judgment_response("趣味", False)
@@ -209,6 +609,21 @@ class TestChatWorkflow(unittest.TestCase):
         ]
         self.assertEqual(len(judgment_statuses), 4)  # 2属性 × 2回（processing, completed）
 
+    def test_judgment_skipped_without_content(self):
+        """保存済みの内容がない属性は判定せず、抽出だけを行う"""
+        self.db.insert_attribute_record(AttributeRecord(sequence_no=None, attribute_id=self.profile_id, content="エンジニア"))
+        self.mock_llm.set_judgment_response("プロフィール", True)
+        self.mock_llm.set_extraction_response("プロフィール", None)
+        self.mock_llm.set_extraction_response("趣味", "登山")
+        self.mock_llm.add_generate_response("いいですね。")
+
+        result = self.chat_service.process_user_input("週末は登山をしています")
+
+        judge_calls = [h for h in self.mock_llm.call_history if h["type"] == "judge"]
+        self.assertEqual(len(judge_calls), 1)
+        self.assertEqual(result.used_attributes, {"プロフィール": "エンジニア"})
+        self.assertEqual(result.extracted_attributes, [("趣味", "登山")])
+
     def test_workflow_step2_attribute_extraction(self):
         """Step 2: 必要な属性データの取得テスト"""
         # プロフィール属性を先に登録しておく
@@ -347,6 +762,348 @@ class TestChatWorkflow(unittest.TestCase):
         )
         self.assertEqual(status2.display_text, "応答文を生成中")
 
+    def test_combined_strategy(self):
+        """combined方式: 判定と抽出を1回の呼び出しで行い、結果は属性ごとの方式と同じになる"""
+        self.chat_service.attribute_strategy = "combined"
+        self.db.insert_attribute_record(AttributeRecord(
+            sequence_no=None,
+            attribute_id=self.profile_id,
+            content="ソフトウェアエンジニア"
+        ))
+        self.mock_llm.set_judgment_response("プロフィール", True)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.set_extraction_response("趣味", "読書")
+        self.mock_llm.add_generate_response("了解しました。")
+
+        result = self.chat_service.process_user_input("趣味は読書です")
+
+        call_types = [h["type"] for h in self.mock_llm.call_history]
+        self.assertEqual(call_types.count("judge_and_extract_all"), 1)
+        self.assertNotIn("judge", call_types)
+        self.assertNotIn("extract", call_types)
+        self.assertEqual(result.used_attributes, {"プロフィール": "ソフトウェアエンジニア"})
+        self.assertEqual(result.extracted_attributes, [("趣味", "読書")])
+
+    def test_batch_judgment_strategy(self):
+        """batch_judgment方式: 判定は1回の呼び出しで行い、抽出は属性ごとに行う"""
+        self.chat_service.attribute_strategy = "batch_judgment"
+        self.db.insert_attribute_record(AttributeRecord(
+            sequence_no=None,
+            attribute_id=self.profile_id,
+            content="ソフトウェアエンジニア"
+        ))
+        self.mock_llm.set_judgment_response("プロフィール", True)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.set_extraction_response("プロフィール", None)
+        self.mock_llm.set_extraction_response("趣味", "読書")
+        self.mock_llm.add_generate_response("了解しました。")
+
+        result = self.chat_service.process_user_input("趣味は読書です")
+
+        call_types = [h["type"] for h in self.mock_llm.call_history]
+        self.assertEqual(call_types.count("judge_batch"), 1)
+        self.assertNotIn("judge", call_types)
+        self.assertEqual(call_types.count("extract"), 2)
+        self.assertEqual(result.used_attributes, {"プロフィール": "ソフトウェアエンジニア"})
+        self.assertEqual(result.extracted_attributes, [("趣味", "読書")])
+
+    def test_fused_strategy(self):
+        """fused方式: 属性ごとに判定と抽出を1回で行い、抽出結果は応答後に登録される"""
+        self.chat_service.attribute_strategy = "fused"
+        self.db.insert_attribute_record(AttributeRecord(
+            sequence_no=None,
+            attribute_id=self.profile_id,
+            content="ソフトウェアエンジニア"
+        ))
+        self.mock_llm.set_judgment_response("プロフィール", True)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.set_extraction_response("趣味", "読書")
+        self.mock_llm.add_generate_response("了解しました。")
+
+        result = self.chat_service.process_user_input("趣味は読書です")
+
+        call_types = [h["type"] for h in self.mock_llm.call_history]
+        self.assertEqual(call_types.count("judge_and_extract"), 2)
+        self.assertNotIn("judge", call_types)
+        self.assertNotIn("extract", call_types)
+        self.assertEqual(result.used_attributes, {"プロフィール": "ソフトウェアエンジニア"})
+        self.assertEqual(result.extracted_attributes, [("趣味", "読書")])
+
+    def test_extraction_runs_in_parallel(self):
+        """属性ごとの抽出が並行して実行される"""
+        self.mock_llm.set_judgment_response("プロフィール", False)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.add_generate_response("了解しました。")
+
+        # 2属性の抽出が同時に実行されていなければタイムアウトする
+        barrier = threading.Barrier(2, timeout=5)
+
+        def on_generate(prompt: str):
+            if "extracts information" in prompt:
+                barrier.wait()
+
+        self.mock_llm.on_generate = on_generate
+
+        result = self.chat_service.process_user_input("週末は山に行きました")
+        self.assertEqual(result.response_text, "了解しました。")
+
+    def test_extraction_failure_keeps_response(self):
+        """属性抽出に失敗してもターン全体は失敗せず、応答は返る"""
+        self.mock_llm.set_judgment_response("プロフィール", False)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.add_generate_response("了解しました。")
+
+        def on_generate(prompt: str):
+            if "extracts information" in prompt:
+                raise ConnectionError("接続できません")
+
+        self.mock_llm.on_generate = on_generate
+
+        result = self.chat_service.process_user_input("週末は山に行きました")
+
+        self.assertEqual(result.response_text, "了解しました。")
+        self.assertEqual(result.extracted_attributes, [])
+        extraction_statuses = [s for s in result.task_statuses if s.task_type == "attribute_extraction"]
+        self.assertTrue(all(s.status == "failed" for s in extraction_statuses))
+
+    def test_background_extraction(self):
+        """バックグラウンド抽出では応答に抽出結果を含めず、完了後にDBへ登録される"""
+        self.chat_service.background_extraction = True
+        self.mock_llm.set_judgment_response("プロフィール", False)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.set_extraction_response("プロフィール", "データサイエンティスト")
+        self.mock_llm.add_generate_response("素晴らしい職業ですね！")
+
+        result = self.chat_service.process_user_input("私はデータサイエンティストです")
+        self.assertEqual(result.response_text, "素晴らしい職業ですね！")
+        self.assertEqual(result.extracted_attributes, [])
+
+        # close()は実行中の抽出・登録を待ってからスレッドプールを停止する
+        self.chat_service.close()
+        profile_records = self.db.get_attribute_records_by_attribute_id(self.profile_id)
+        self.assertEqual([r.content for r in profile_records], ["データサイエンティスト"])
+        with self.assertRaises(RuntimeError):
+            self.chat_service._executor.submit(print)
+
+    def test_background_extraction_failure_is_logged(self):
+        """バックグラウンドでの抽出・登録の失敗はログに警告として残す"""
+        self.chat_service.background_extraction = True
+        self.mock_llm.set_extraction_response("プロフィール", "データサイエンティスト")
+
+        def failing_insert(records):
+            raise sqlite3.OperationalError("database is locked")
+
+        self.db.insert_attribute_records_bulk = failing_insert
+        self.chat_service.process_user_input("私はデータサイエンティストです")
+        with self.assertLogs("src.chat_service", level="WARNING"):
+            self.chat_service.wait_for_extraction()
+
+    def test_extract_only_required(self):
+        """extract_only_requiredでは判定で不要とされた属性の抽出を行わない"""
+        self.chat_service.extract_only_required = True
+        self.db.insert_attribute_records_bulk([
+            AttributeRecord(sequence_no=None, attribute_id=self.profile_id, content="学生"),
+            AttributeRecord(sequence_no=None, attribute_id=self.hobby_id, content="読書"),
+        ])
+        self.mock_llm.set_judgment_response("プロフィール", True)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.set_extraction_response("プロフィール", "エンジニア")
+        self.mock_llm.set_extraction_response("趣味", "登山")
+        self.mock_llm.add_generate_response("なるほど。")
+
+        result = self.chat_service.process_user_input("エンジニアで、週末は登山をしています")
+
+        self.assertEqual(result.extracted_attributes, [("プロフィール", "エンジニア")])
+        extract_calls = [h for h in self.mock_llm.call_history if h["type"] == "extract"]
+        self.assertEqual(len(extract_calls), 1)
+
+    def test_trivial_input_skips_attributes(self):
+        """挨拶のみの入力では属性の判定・抽出を行わない"""
+        self.mock_llm.add_generate_response("こんにちは！")
+
+        result = self.chat_service.process_user_input("こんにちは！")
+
+        self.assertEqual(result.response_text, "こんにちは！")
+        call_types = [h["type"] for h in self.mock_llm.call_history]
+        self.assertNotIn("judge", call_types)
+        self.assertNotIn("extract", call_types)
+        self.assertIn("skip_extraction", [s.task_type for s in self.status_history])
+
+    def test_translation_skipped_for_english_input(self):
+        """日本語を含まない入力は英語への翻訳を省略する"""
+        self.chat_service.translation_service = TranslationService(self.mock_llm)
+        self.mock_llm.set_judgment_response("プロフィール", False)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.set_extraction_response("プロフィール", None)
+        self.mock_llm.set_extraction_response("趣味", None)
+        self.mock_llm.add_generate_response("Sure, I can help.")
+        self.mock_llm.add_generate_response("もちろんお手伝いします。")
+
+        result = self.chat_service.process_user_input("Can you help me plan my week?")
+
+        task_types = [s.task_type for s in result.task_statuses]
+        self.assertIn("translation_skipped", task_types)
+        self.assertNotIn("translation_input", task_types)
+        self.assertIn("translation_response", task_types)
+        self.assertEqual(result.response_text, "もちろんお手伝いします。")
+        # 次のターンの翻訳には直近2件の英語メッセージがコンテキストとして使われる
+        self.assertEqual(
+            [m["content"] for m in self.chat_service._translation_context],
+            ["Can you help me plan my week?", "Sure, I can help."]
+        )
+        self.assertTrue(is_japanese("明日の会議は10時からです"))
+        self.assertFalse(is_japanese("The meeting starts at 10 tomorrow."))
+        # 英文中の日本語の人名・単語は、応答を日本語の文章とみなす理由にならない
+        self.assertTrue(is_mostly_japanese("明日の会議は10時からです"))
+        self.assertFalse(is_mostly_japanese("Hello 田中さん, how can I help you today?"))
+        self.assertFalse(is_mostly_japanese("Your next meeting is on 月曜日."))
+
+    def test_response_cache(self):
+        """同じ履歴・同じ属性データで同じ入力を受けたら、LLMを呼ばずに前回の応答を返す"""
+        service = ChatService(llm_client=self.mock_llm, database=self.db, response_cache_size=4)
+        self.mock_llm.set_judgment_response("プロフィール", False)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.set_extraction_response("プロフィール", None)
+        self.mock_llm.set_extraction_response("趣味", None)
+        self.mock_llm.add_generate_response("今日は晴れです。")
+
+        first = service.process_user_input("今日の天気は？")
+        service.clear_history()
+        call_count = len(self.mock_llm.call_history)
+        second = service.process_user_input("今日の天気は？")
+
+        self.assertEqual(second.response_text, first.response_text)
+        self.assertEqual(len(self.mock_llm.call_history), call_count)
+        self.assertEqual([m.content for m in service.get_chat_history()], ["今日の天気は？", "今日は晴れです。"])
+
+        # 属性レコードが更新されたら改めて判定するが、使う属性が同じなら応答は生成し直さない
+        self.db.insert_attribute_record(AttributeRecord(sequence_no=None, attribute_id=self.profile_id, content="エンジニア"))
+        service.clear_history()
+        third = service.process_user_input("今日の天気は? ")
+        new_calls = [h["type"] for h in self.mock_llm.call_history[call_count:]]
+        self.assertIn("judge", new_calls)
+        self.assertNotIn("generate", new_calls)
+        self.assertEqual(third.response_text, first.response_text)
+
+    def test_response_cache_after_failed_extraction(self):
+        """抽出に失敗したターンは、次回の同じ入力で判定・抽出を省略せずに抽出し直す"""
+        service = ChatService(llm_client=self.mock_llm, database=self.db, response_cache_size=4)
+        self.mock_llm.set_judgment_response("プロフィール", False)
+        self.mock_llm.set_judgment_response("趣味", False)
+        self.mock_llm.set_extraction_response("プロフィール", "エンジニア")
+        self.mock_llm.set_extraction_response("趣味", None)
+        self.mock_llm.add_generate_response("そうなんですね。")
+
+        def failing_extract(*args, **kwargs):
+            raise ConnectionError("接続できません")
+
+        self.mock_llm.extract = failing_extract
+        first = service.process_user_input("私はエンジニアです")
+        self.assertIn("failed", [s.status for s in first.task_statuses])
+        self.assertEqual(first.extracted_attributes, [])
+
+        del self.mock_llm.extract
+        service.clear_history()
+        second = service.process_user_input("私はエンジニアです")
+        self.assertEqual(second.response_text, first.response_text)
+        self.assertEqual(second.extracted_attributes, [("プロフィール", "エンジニア")])
+        self.assertEqual(self.db.get_latest_attribute_content(self.profile_id), "エンジニア")
+
+    def test_translation_cache(self):
+        """同じ文章・同じコンテキストの翻訳はLLMを呼ばずにキャッシュから返す"""
+        translation_service = TranslationService(self.mock_llm, cache_size=2)
+        self.mock_llm.add_generate_response("Hello")
+        self.mock_llm.add_generate_response("Hi")
+
+        self.assertEqual(translation_service.translate_ja_to_en("こんにちは"), "Hello")
+        self.assertEqual(translation_service.translate_ja_to_en("こんにちは"), "Hello")
+        self.assertEqual(len(self.mock_llm.call_history), 1)
+
+        # コンテキストが違えば別の翻訳として扱う
+        context = [{"role": "user", "content": "Good morning"}]
+        self.assertEqual(translation_service.translate_ja_to_en("こんにちは", context), "Hi")
+        self.assertEqual(len(self.mock_llm.call_history), 2)
+
+        # 組み立て済みのコンテキストを渡しても同じ翻訳として扱う
+        context_text = format_translation_context(context)
+        self.assertEqual(translation_service.translate_ja_to_en("こんにちは", context_text=context_text), "Hi")
+        self.assertEqual(len(self.mock_llm.call_history), 2)
+
+    def test_translation_skipped_for_untranslatable_text(self):
+        """空・翻訳元の言語を含まない文章はLLMを呼ばずにそのまま返す"""
+        translation_service = TranslationService(self.mock_llm)
+
+        self.assertEqual(translation_service.translate_ja_to_en("  "), "")
+        self.assertEqual(translation_service.translate_ja_to_en("OK 123"), "OK 123")
+        self.assertEqual(translation_service.translate_en_to_ja("42!"), "42!")
+        self.assertEqual(translation_service.translate_en_to_ja("了解です。"), "了解です。")
+        self.assertEqual(self.mock_llm.call_history, [])
+
+        # 日本語の単語を含む英文は翻訳する
+        self.mock_llm.add_generate_response("トヨタにお勤めなのですね。")
+        self.assertEqual(translation_service.translate_en_to_ja("I see you work at トヨタ."), "トヨタにお勤めなのですね。")
+        self.assertEqual(len(self.mock_llm.call_history), 1)
+
+    def test_concurrent_translation_is_shared(self):
+        """同じ翻訳を同時に依頼されたら、LLMを1回だけ呼んで結果を共有する"""
+        translation_service = TranslationService(self.mock_llm, cache_size=0)
+        self.mock_llm.add_generate_response("Hello")
+        self.mock_llm.on_generate = lambda prompt: time.sleep(0.2)
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(translation_service.translate_ja_to_en("こんにちは")))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["Hello", "Hello"])
+        self.assertEqual(len(self.mock_llm.call_history), 1)
+
+    def test_chat_history_is_bounded(self):
+        """チャット履歴は上限件数を超えると古いものから破棄され、直近のメッセージを順に取得できる"""
+        service = ChatService(llm_client=self.mock_llm, database=self.db, history_limit=4)
+        for i in range(6):
+            service.chat_history.append(ChatMessage(role="user", content=f"メッセージ{i}"))
+
+        self.assertEqual([m.content for m in service.get_chat_history()], [f"メッセージ{i}" for i in range(2, 6)])
+        self.assertEqual([m.content for m in service._recent_messages(2, skip_latest=1)], ["メッセージ3", "メッセージ4"])
+
+    def test_tier_model_selection(self):
+        """入力の複雑さに応じて抽出に使うモデルが選ばれる"""
+        self.assertEqual(parse_tier_models("1:llama3.2:1b, 3:qwen2.5:14b"), {1: "llama3.2:1b", 3: "qwen2.5:14b"})
+        self.assertEqual(select_tier("I am an engineer"), 1)
+        self.assertEqual(select_tier(" ".join(["word"] * 80)), MAX_TIER)
+
+        # ティア2のモデルが無い場合は上位のティアを使う
+        self.chat_service.tier_models = {1: "small", 3: "large"}
+        model, metadata = self.chat_service._select_extraction_model(" ".join(["word"] * 30))
+        self.assertEqual(model, "large")
+        self.assertEqual(metadata, {"start_tier": 2, "tier": 3})
+
+    def test_parse_attribute_analysis(self):
+        """一括判定・抽出のJSON応答の検証"""
+        analysis = parse_attribute_analysis(
+            'Here is the result: {"A": {"required": "yes", "extracted": "none"}, "B": {"required": false, "extracted": "tea"}}',
+            ["A", "B"]
+        )
+        self.assertTrue(analysis["A"].required)
+        self.assertIsNone(analysis["A"].extracted)
+        self.assertEqual(analysis["B"].extracted, "tea")
+
+        # 属性が欠けている場合はエラー
+        with self.assertRaises(ValueError):
+            parse_attribute_analysis('{"A": {"required": true, "extracted": null}}', ["A", "B"])
+
+    def test_parse_batch_judgment(self):
+        """一括判定のJSON応答の検証"""
+        self.assertEqual(parse_batch_judgment('{"A": true, "B": "no"}', ["A", "B"]), {"A": True, "B": False})
+        with self.assertRaises(ValueError):
+            parse_batch_judgment('{"A": true}', ["A", "B"])
+
 
 class TestDefaultAttributeMasters(unittest.TestCase):
     """デフォルト属性マスタのテスト"""
@@ -377,6 +1134,18 @@ class TestDefaultAttributeMasters(unittest.TestCase):
         for name in expected_names:
             self.assertIn(name, attribute_names)
 
+    def test_ensure_default_masters(self):
+        """未登録のデフォルト属性だけを追加し、2回目以降は何もしない"""
+        create_default_attribute_masters(self.db)
+        profile = next(m for m in self.db.get_all_attribute_masters() if m.attribute_name == "User Profile")
+        self.db.delete_attribute_master(profile.attribute_id)
+
+        # 属性マスタが残っている場合、起動時の初期化では追加しない
+        self.assertEqual(ensure_default_attribute_masters(self.db, only_if_empty=True), 0)
+        self.assertEqual(ensure_default_attribute_masters(self.db), 1)
+        self.assertEqual(ensure_default_attribute_masters(self.db), 0)
+        self.assertEqual(len(self.db.get_all_attribute_masters()), 4)
+
 
 class TestStreamingWorkflow(unittest.TestCase):
     """ストリーミングワークフローのテスト"""
@@ -427,6 +1196,116 @@ class TestStreamingWorkflow(unittest.TestCase):
         # 最終結果が正しいことを確認
         self.assertEqual(result.response_text, "テスト応答")
 
+    def test_streaming_translation_by_sentence(self):
+        """stream_translationでは応答を文ごとに翻訳し、翻訳できた文から順に通知する"""
+        self.chat_service.translation_service = TranslationService(self.mock_llm, cache_size=0)
+        self.chat_service.stream_translation = True
+        # MockLLMClientの応答は呼び出し順に返るため、翻訳を逐次実行にする
+        self.chat_service.llm_concurrency = 1
+        self.mock_llm.set_judgment_response("テスト属性", False)
+        self.mock_llm.set_extraction_response("テスト属性", None)
+        self.mock_llm.add_generate_response("Test input")
+        self.mock_llm.add_generate_response("Hello there. 42! How are you?")
+        self.mock_llm.add_generate_response("こんにちは。")
+        self.mock_llm.add_generate_response("お元気ですか？")
+
+        generator = self.chat_service.process_user_input_streaming("テスト入力")
+        statuses = []
+        try:
+            while True:
+                statuses.append(next(generator))
+        except StopIteration as e:
+            result = e.value
+
+        deltas = [s.response_text for s in statuses if s.task_type == "response_delta"]
+        # 数字・記号のみの文は翻訳せずにそのまま使う
+        self.assertEqual(deltas, ["こんにちは。", "42!", "お元気ですか？"])
+        self.assertEqual(result.response_text, "こんにちは。42!お元気ですか？")
+        self.assertEqual(self.chat_service.get_chat_history()[-1].content_en, "Hello there. 42! How are you?")
+
+    def test_streaming_translation_in_parallel(self):
+        """文ごとの翻訳を並行実行しても、応答の文の順番で通知する"""
+        translations = {"First one.": "一つ目。", "Second one.": "二つ目。"}
+
+        def translate(text, context_messages=None, *, context_text=None):
+            # 先の文ほど翻訳に時間がかかり、後の文が先に終わる
+            time.sleep(0.1 if text == "First one." else 0)
+            return translations[text]
+
+        translation_service = TranslationService(self.mock_llm, cache_size=0)
+        translation_service.translate_en_to_ja = translate
+        translation_service.translate_ja_to_en = lambda text, context_messages=None: "Test input"
+        self.chat_service.translation_service = translation_service
+        self.chat_service.stream_translation = True
+        self.mock_llm.set_judgment_response("テスト属性", False)
+        self.mock_llm.set_extraction_response("テスト属性", None)
+        self.mock_llm.add_generate_response("First one. Second one.")
+
+        generator = self.chat_service.process_user_input_streaming("テスト入力")
+        statuses = []
+        try:
+            while True:
+                statuses.append(next(generator))
+        except StopIteration as e:
+            result = e.value
+
+        deltas = [s.response_text for s in statuses if s.task_type == "response_delta"]
+        self.assertEqual(deltas, ["一つ目。", "二つ目。"])
+        self.assertEqual(result.response_text, "一つ目。二つ目。")
+
+    def test_closed_stream_cancels_prefetched_extraction(self):
+        """応答の途中でストリームを閉じたら、まだ始まっていない先行抽出は実行しない"""
+        for i in range(3):
+            self.db.insert_attribute_master(AttributeMaster(
+                attribute_id=0, attribute_name=f"属性{i}", extraction_prompt=f"抽出{i}", judgment_prompt=f"判定{i}"
+            ))
+        service = ChatService(llm_client=self.mock_llm, database=self.db, llm_concurrency=2)
+        self.mock_llm.set_judgment_response("テスト属性", False)
+        self.mock_llm.add_generate_response("テスト応答")
+
+        extract = self.mock_llm.extract
+        extract_calls = []
+
+        def slow_extract(*args, **kwargs):
+            extract_calls.append(args)
+            time.sleep(0.2)
+            return extract(*args, **kwargs)
+
+        self.mock_llm.extract = slow_extract
+        generator = service.process_user_input_streaming("テスト入力")
+        for status in generator:
+            if status.task_type == "response" and status.status == "processing":
+                break
+        generator.close()
+        time.sleep(0.5)
+
+        # 同時実行数（2）を超える分は取り消され、4属性すべての抽出は行われない
+        self.assertEqual(len(extract_calls), 2)
+        self.assertEqual(self.db.get_all_attribute_records(), [])
+
+    def test_streaming_translation_not_queued_behind_extraction(self):
+        """文ごとの翻訳は、先行して投入した属性の抽出の完了を待たずに通知する"""
+        for i in range(3):
+            self.db.insert_attribute_master(AttributeMaster(
+                attribute_id=0, attribute_name=f"属性{i}", extraction_prompt=f"抽出{i}", judgment_prompt=f"判定{i}"
+            ))
+        translation_service = TranslationService(self.mock_llm, cache_size=0)
+        translation_service.translate_en_to_ja = lambda text, context_messages=None, *, context_text=None: "翻訳。"
+        translation_service.translate_ja_to_en = lambda text, context_messages=None: "Test input"
+        self.chat_service.translation_service = translation_service
+        self.chat_service.stream_translation = True
+        self.mock_llm.add_generate_response("Hello there.")
+        # 抽出のLLM呼び出しだけを遅くする
+        self.mock_llm.on_generate = lambda prompt: time.sleep(0.5) if "Extracted content:" in prompt or "抽出された内容:" in prompt else None
+
+        start = time.perf_counter()
+        first_delta = None
+        for status in self.chat_service.process_user_input_streaming("テスト入力"):
+            if status.task_type == "response_delta" and first_delta is None:
+                first_delta = time.perf_counter() - start
+        self.assertIsNotNone(first_delta)
+        self.assertLess(first_delta, 0.4)
+
 
 if __name__ == "__main__":
     unittest.main()